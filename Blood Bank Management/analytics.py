@@ -0,0 +1,226 @@
+# Analytics — vectorised reports over the full donation and issue history
+# The donations, issues and wastage columns (epoch day, group code, units, ...) are read
+# once into NumPy arrays, archive partitions included, and kept until the database
+# changes. Every metric is then a bincount/cumsum over those arrays, so multi-year
+# series, rolling averages, wastage rates and retention curves need no further SQL.
+# The report_* equivalents return the same values as database.report_*.
+# NumPy is optional for the rest of the application; only this module needs it.
+import argparse
+import itertools
+import threading
+import time
+import database
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+GROUPS = len(database.BLOOD_GROUPS)
+RETENTION_MONTHS = 12
+
+_lock = threading.Lock()
+_cache = {}
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("analytics needs NumPy: pip install numpy")
+
+def _columns(conn, sql, width):
+    # One query, flattened straight into an int64 array of shape (rows, width).
+    cur = conn.cursor()
+    cur.row_factory = None
+    data = np.fromiter(itertools.chain.from_iterable(cur.execute(sql)), dtype=np.int64)
+    return data.reshape(-1, width)
+
+def load(force=False):
+    # Arrays for the current database, reloaded when this connection or any other
+    # has written since the last load (same test as the inventory snapshot cache).
+    _require_numpy()
+    conn = database.get_conn()
+    key = (conn.serial, conn.execute("PRAGMA data_version").fetchone()[0], conn.total_changes)
+    with _lock:
+        cached = _cache.get(database.DB_FILE)
+        if cached is not None and cached["key"] == key and not force:
+            return cached
+    started = time.perf_counter()
+    donations = _columns(conn, f"""
+        SELECT id, donation_date / 86400, blood_group, units, donor_id FROM {database._history("donations")}
+        WHERE {database.DONATED_SQL} ORDER BY id
+    """, 5)
+    issues = _columns(conn, f"""
+        SELECT issue_date / 86400, requested_blood_group, blood_group_issued, units FROM {database._history("issues")}
+    """, 4)
+    wastage = _columns(conn, "SELECT donation_id, expiry_date / 86400, blood_group, units FROM wastage", 4)
+    arrays = {
+        "key": key,
+        "donation_id": donations[:, 0], "donation_day": donations[:, 1], "donation_group": donations[:, 2],
+        "donation_units": donations[:, 3], "donor_id": donations[:, 4],
+        "issue_day": issues[:, 0], "issue_group": issues[:, 1], "issued_group": issues[:, 2], "issue_units": issues[:, 3],
+        "wastage_donation": wastage[:, 0], "wastage_day": wastage[:, 1], "wastage_group": wastage[:, 2],
+        "wastage_units": wastage[:, 3],
+        "load_s": time.perf_counter() - started,
+    }
+    with _lock:
+        _cache[database.DB_FILE] = arrays
+    return arrays
+
+def invalidate():
+    with _lock:
+        _cache.clear()
+
+def _day_bounds(start, end):
+    lo, hi = database._date_bounds(start, end, days=True)
+    return lo, (hi - 1 if hi is not None else None)
+
+def _select(days, start, end):
+    lo, hi = _day_bounds(start, end)
+    mask = np.ones(len(days), dtype=bool)
+    if lo is not None:
+        mask &= days >= lo
+    if hi is not None:
+        mask &= days <= hi
+    return mask
+
+def _day_strings(days):
+    return np.datetime_as_string(days.astype("datetime64[D]"), unit="D")
+
+def _months(days):
+    # Months since 1970-01.
+    return days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+
+# Series
+def daily_series(kind="donations", start=None, end=None):
+    # (days, units): every epoch day from the first to the last event in range, and
+    # units per day and blood group code, shape (len(days), GROUPS). kind is
+    # "donations" or "issues" (by requested group, like the rollups).
+    a = load()
+    if kind == "donations":
+        days, groups, units = a["donation_day"], a["donation_group"], a["donation_units"]
+    elif kind == "issues":
+        days, groups, units = a["issue_day"], a["issue_group"], a["issue_units"]
+    else:
+        raise ValueError("kind must be 'donations' or 'issues'")
+    mask = _select(days, start, end)
+    days, groups, units = days[mask], groups[mask], units[mask]
+    lo, hi = _day_bounds(start, end)
+    if not len(days) and (lo is None or hi is None):
+        return np.zeros(0, dtype=np.int64), np.zeros((0, GROUPS), dtype=np.int64)
+    first = lo if lo is not None else int(days.min())
+    last = hi if hi is not None else int(days.max())
+    cells = np.bincount((days - first) * GROUPS + groups, weights=units, minlength=(last - first + 1) * GROUPS)
+    return np.arange(first, last + 1), cells.astype(np.int64).reshape(-1, GROUPS)
+
+def rolling_average(kind="donations", window=7, start=None, end=None):
+    # Trailing mean over `window` days per group; the first days average what exists so far.
+    window = int(window)
+    if window < 1:
+        raise ValueError("window must be at least 1")
+    days, units = daily_series(kind, start, end)
+    totals = np.cumsum(units, axis=0, dtype=np.float64)
+    shifted = np.zeros_like(totals)
+    shifted[window:] = totals[:-window]
+    span = np.minimum(np.arange(1, len(days) + 1), window)[:, None]
+    return days, (totals - shifted) / span
+
+def wastage_rates(start=None, end=None):
+    # Per blood group: units donated in range, how many of those were later retired at
+    # expiry, and the fraction wasted. Lots are counted by their donation day.
+    a = load()
+    mask = _select(a["donation_day"], start, end)
+    donated = np.bincount(a["donation_group"][mask], weights=a["donation_units"][mask], minlength=GROUPS)
+    # Wastage rows point at donations by id; donation ids are loaded sorted.
+    ids = a["donation_id"]
+    known = np.zeros(len(a["wastage_donation"]), dtype=bool)
+    if len(ids):
+        pos = np.minimum(np.searchsorted(ids, a["wastage_donation"]), len(ids) - 1)
+        known = (ids[pos] == a["wastage_donation"]) & mask[pos]
+    wasted = np.bincount(a["wastage_group"][known], weights=a["wastage_units"][known], minlength=GROUPS)
+    return [(bg, int(donated[i]), int(wasted[i]), round(float(wasted[i] / donated[i]), 4) if donated[i] else 0.0)
+            for i, bg in enumerate(database.BLOOD_GROUPS)]
+
+def donor_retention(months=RETENTION_MONTHS):
+    # Cohorts by the month of each donor's first donation. Returns (cohorts, sizes,
+    # curve) where curve[c, k] is the fraction of cohort c that donated again k months
+    # after joining (curve[c, 0] is 1). Months not yet reached are NaN.
+    a = load()
+    months = int(months)
+    if not len(a["donor_id"]):
+        return [], np.zeros(0, dtype=np.int64), np.zeros((0, months + 1))
+    donor, month = a["donor_id"], _months(a["donation_day"])
+    first = np.full(int(donor.max()) + 1, np.iinfo(np.int64).max)
+    np.minimum.at(first, donor, month)
+    offset = month - first[donor]
+    keep = offset <= months
+    active = np.unique(donor[keep] * (months + 1) + offset[keep])
+    active_donor, active_offset = active // (months + 1), active % (months + 1)
+    cohort_months, cohort = np.unique(first[active_donor], return_inverse=True)
+    counts = np.bincount(cohort * (months + 1) + active_offset,
+                         minlength=len(cohort_months) * (months + 1)).reshape(-1, months + 1)
+    sizes = counts[:, 0]
+    curve = counts / sizes[:, None]
+    reached = np.arange(months + 1)[None, :] <= (_months(np.array([database._today()]))[0] - cohort_months)[:, None]
+    curve[~reached] = np.nan
+    labels = np.datetime_as_string(cohort_months.astype("datetime64[M]"), unit="M")
+    return list(labels), sizes, curve
+
+# Report equivalents
+def report_most_requested_group():
+    a = load()
+    counts = np.bincount(a["issue_group"], minlength=GROUPS)
+    return (database.BLOOD_GROUPS[int(counts.argmax())], int(counts.max())) if counts.any() else (None, 0)
+
+def report_most_donated_group():
+    a = load()
+    if not len(a["donation_group"]):
+        return None, 0
+    units = np.bincount(a["donation_group"], weights=a["donation_units"], minlength=GROUPS).astype(np.int64)
+    return database.BLOOD_GROUPS[int(units.argmax())], int(units.max())
+
+def report_daily_donations():
+    # (YYYY-MM-DD, units) for days with donations, newest first.
+    a = load()
+    days, inverse = np.unique(a["donation_day"], return_inverse=True)
+    units = np.bincount(inverse, weights=a["donation_units"], minlength=len(days)).astype(np.int64)
+    return list(zip(_day_strings(days)[::-1].tolist(), units[::-1].tolist()))
+
+def report_monthly_donations():
+    a = load()
+    months, inverse = np.unique(_months(a["donation_day"]), return_inverse=True)
+    units = np.bincount(inverse, weights=a["donation_units"], minlength=len(months)).astype(np.int64)
+    labels = np.datetime_as_string(months.astype("datetime64[M]"), unit="M")
+    return list(zip(labels[::-1].tolist(), units[::-1].tolist()))
+
+def main():
+    parser = argparse.ArgumentParser(description="Blood bank analytics")
+    parser.add_argument("--db", default=database.DB_FILE)
+    parser.add_argument("--start", help="YYYY-MM-DD")
+    parser.add_argument("--end", help="YYYY-MM-DD")
+    parser.add_argument("--window", type=int, default=7, help="rolling average window in days")
+    parser.add_argument("--months", type=int, default=RETENTION_MONTHS, help="retention curve length")
+    args = parser.parse_args()
+    database.DB_FILE = args.db
+    database.init_db()
+    a = load()
+    print(f"Loaded {len(a['donation_day'])} donations, {len(a['issue_day'])} issues and "
+          f"{len(a['wastage_day'])} wasted lots in {a['load_s'] * 1000:.1f} ms")
+    started = time.perf_counter()
+    days, avg = rolling_average("issues", args.window, args.start, args.end)
+    rates = wastage_rates(args.start, args.end)
+    cohorts, sizes, curve = donor_retention(args.months)
+    elapsed = (time.perf_counter() - started) * 1000
+    if len(days):
+        print(f"\n{args.window}-day average issued units per group on {_day_strings(days[-1:])[0]}:")
+        for bg, value in zip(database.BLOOD_GROUPS, avg[-1]):
+            print(f"  {bg:4s} {value:7.2f}")
+    print("\nWastage (group, donated, wasted, rate):")
+    for bg, donated, wasted, rate in rates:
+        print(f"  {bg:4s} {donated:8d} {wasted:8d} {rate:7.2%}")
+    print(f"\nDonor retention by first-donation month (cohort, donors, months 1/3/6/{args.months}):")
+    for label, size, row in zip(cohorts, sizes, curve):
+        points = [row[k] for k in sorted({1, 3, 6, args.months}) if k <= args.months]
+        print(f"  {label} {size:6d} " + " ".join("    -  " if np.isnan(p) else f"{p:7.1%}" for p in points))
+    print(f"\nComputed in {elapsed:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+# Benchmarks — synthetic data generator and timing runner for database.py
+# `python bench.py generate --db big.db --size 100000` builds a reproducible dataset;
+# `python bench.py run --sizes 10000 100000 1000000 --out bench.json` times the public
+# API on fresh datasets of each size and writes the results as JSON.
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from collections import deque
+from datetime import datetime, timedelta
+import database
+from donation_codes import new_donation_code
+
+# Approximate ABO/Rh frequencies of the donor population.
+GROUP_WEIGHTS = {"O+": 37.4, "A+": 35.7, "B+": 8.5, "O-": 6.6, "A-": 6.3, "AB+": 3.4, "B-": 1.5, "AB-": 0.6}
+HISTORY_DAYS = 730
+CHUNK = 20000
+FIRST_NAMES = ["Asha", "Ravi", "Meera", "Arjun", "Sara", "John", "Li", "Fatima", "Carlos", "Nina", "Omar", "Priya"]
+LAST_NAMES = ["Yadav", "Sharma", "Khan", "Smith", "Garcia", "Chen", "Singh", "Patel", "Okafor", "Ivanova"]
+CITIES = ["Delhi", "Mumbai", "Pune", "Lucknow", "Patna", "Jaipur", "Chennai", "Kolkata"]
+
+def generate(db_file, size, seed=42):
+    # size donors and donations, size // 2 issues and size // 10 recipients, spread over
+    # HISTORY_DAYS. Issues are allocated to lots first-expiry-first-out while generating,
+    # so lots, allocations, inventory and rollups are all consistent afterwards.
+    rng = random.Random(seed)
+    groups, weights = list(GROUP_WEIGHTS), list(GROUP_WEIGHTS.values())
+    database.DB_FILE = db_file
+    database.init_db()
+    start = datetime.now() - timedelta(days=HISTORY_DAYS)
+
+    donors = []
+    for i in range(size):
+        donors.append((f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}", rng.randint(18, 65),
+                       rng.choice(["Male", "Female", "Other"]), f"9{rng.randrange(10**9):09d}",
+                       f"{rng.randint(1, 999)} Main Road, {rng.choice(CITIES)}", rng.choices(groups, weights)[0], None))
+    recipients = [(f"Patient {i}", rng.randint(1, 90), rng.choices(groups, weights)[0], rng.randint(1, 4),
+                   f"Hospital {rng.randint(1, 50)}") for i in range(max(1, size // 10))]
+    # Rows are written in the schema v2 encoding (see database.BG_CODE and friends).
+    code = database.BG_CODE
+    with database.transaction() as conn:
+        for k in range(0, len(donors), CHUNK):
+            conn.executemany("""
+                INSERT INTO donors (name, age, gender, phone, address, blood_group, last_donation_date)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [d[:5] + (code[d[5]], d[6]) for d in donors[k:k + CHUNK]])
+        conn.executemany("""
+            INSERT INTO recipients (name, age, required_blood_group, quantity_needed, hospital_name)
+            VALUES (?, ?, ?, ?, ?)
+        """, [r[:2] + (code[r[2]],) + r[3:] for r in recipients])
+
+    # Events in time order: donations add lots, issues draw from the oldest live lot.
+    events = [(start + timedelta(seconds=rng.randrange(HISTORY_DAYS * 86400)), 0, rng.randrange(size)) for _ in range(size)]
+    events += [(start + timedelta(seconds=rng.randrange(HISTORY_DAYS * 86400)), 1, rng.randrange(len(recipients)))
+               for _ in range(size // 2)]
+    events.sort()
+    lots = {g: deque() for g in groups}
+    donations, issues, allocations, last_donation = [], [], [], {}
+    for when, kind, idx in events:
+        if kind == 0:
+            bg = donors[idx][5]
+            lot = [len(donations) + 1, rng.randint(1, 3), when + timedelta(days=database.DONATION_EXPIRY_DAYS)]
+            donations.append([idx + 1, new_donation_code(), code[bg], lot[1], database._ts(when), database._ts(lot[2]), lot])
+            lots[bg].append(lot)
+            last_donation[idx + 1] = database._day(when)
+            continue
+        requested = recipients[idx][2]
+        units = rng.randint(1, 2)
+        for g in [requested] + [g for g in database.COMPATIBILITY[requested] if g != requested]:
+            live = lots[g]
+            while live and (live[0][2] < when or live[0][1] == 0):
+                live.popleft()
+            if sum(l[1] for l in live) >= units:
+                issue_id = len(issues) + 1
+                issues.append((idx + 1, code[requested], code[g], units, database._ts(when), 1))
+                need = units
+                for lot in live:
+                    take = min(need, lot[1])
+                    if take:
+                        lot[1] -= take
+                        need -= take
+                        allocations.append((issue_id, lot[0], take))
+                    if not need:
+                        break
+                break
+    with database.transaction() as conn:
+        rows = [d[:6] + [d[6][1]] for d in donations]
+        for k in range(0, len(rows), CHUNK):
+            conn.executemany("""
+                INSERT INTO donations (donor_id, donation_code, blood_group, units, donation_date, expiry_date, remaining_units)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, rows[k:k + CHUNK])
+        for k in range(0, len(issues), CHUNK):
+            conn.executemany("""
+                INSERT INTO issues (recipient_id, requested_blood_group, blood_group_issued, units, issue_date, compatible)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, issues[k:k + CHUNK])
+        conn.executemany("INSERT INTO issue_allocations (issue_id, donation_id, units) VALUES (?, ?, ?)", allocations)
+        conn.executemany("UPDATE donors SET last_donation_date = ? WHERE id = ?",
+                         [(day, donor_id) for donor_id, day in last_donation.items()])
+    # Lots that expired during the generated history become wastage, as the sweep would have done.
+    database.recalc_inventory()
+    database.backfill_rollups()
+    return {"donors": len(donors), "recipients": len(recipients), "donations": len(donations), "issues": len(issues)}
+
+def _time(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - t) * 1000)
+    samples.sort()
+    return {"runs": repeat, "median_ms": round(statistics.median(samples), 4),
+            "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+            "max_ms": round(samples[-1], 4)}
+
+def run_size(size, repeat, seed=42):
+    with tempfile.TemporaryDirectory() as d:
+        t = time.perf_counter()
+        counts = generate(os.path.join(d, "bench.db"), size, seed)
+        gen_s = time.perf_counter() - t
+        rng = random.Random(seed + 1)
+        conn = database.get_conn()
+        donor_ids = [r[0] for r in conn.execute("SELECT id FROM donors ORDER BY random() LIMIT 1000")]
+        recipient_ids = [r[0] for r in conn.execute("SELECT id FROM recipients ORDER BY random() LIMIT 1000")]
+        wanted = set(donor_ids)
+        donor_group = {r["id"]: r["blood_group"] for r in database.list_donors() if r["id"] in wanted}
+
+        def cold(func):
+            def wrapper():
+                database._invalidate_inventory()
+                return func()
+            return wrapper
+
+        def record_donation():
+            donor_id = rng.choice(donor_ids)
+            database.record_donation(donor_id, donor_group[donor_id], 1)
+
+        def record_issue():
+            try:
+                database.record_issue(rng.choice(recipient_ids), "AB+", 1)
+            except ValueError:
+                pass
+
+        cases = {
+            "record_donation": record_donation,
+            "record_issue": record_issue,
+            "search_donors": lambda: database.search_donors(term=rng.choice(LAST_NAMES)),
+            "search_donors_location": lambda: database.search_donors(blood_group="O-", location=rng.choice(CITIES)),
+            "eligible_donors": database.eligible_donors,
+            "match_eligible_donors": lambda: database.match_eligible_donors(rng.choice(list(GROUP_WEIGHTS))),
+            "list_inventory": database.list_inventory,
+            "list_inventory_cold": cold(database.list_inventory),
+            "low_stock_alerts": database.low_stock_alerts,
+            "report_totals": database.report_totals,
+            "report_most_requested_group": database.report_most_requested_group,
+            "report_most_donated_group": database.report_most_donated_group,
+            "report_daily_donations": database.report_daily_donations,
+            "report_monthly_donations": database.report_monthly_donations,
+        }
+        results = {name: _time(func, repeat) for name, func in cases.items()}
+        database.close_conn()
+    return {"rows": counts, "generate_s": round(gen_s, 2), "timings": results}
+
+def main():
+    parser = argparse.ArgumentParser(description="database.py benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("generate", help="build a synthetic database")
+    p.add_argument("--db", required=True)
+    p.add_argument("--size", type=int, default=10000)
+    p.add_argument("--seed", type=int, default=42)
+    p = sub.add_parser("run", help="time the public API at several sizes")
+    p.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    p.add_argument("--repeat", type=int, default=20)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--out", default="bench.json")
+    args = parser.parse_args()
+    if args.command == "generate":
+        if os.path.exists(args.db):
+            sys.exit(f"{args.db} already exists")
+        print(generate(args.db, args.size, args.seed))
+        return
+    report = {"created": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+              "sqlite": sqlite3.sqlite_version, "platform": platform.platform(), "repeat": args.repeat, "sizes": {}}
+    for size in args.sizes:
+        print(f"size {size}...", flush=True)
+        report["sizes"][str(size)] = run_size(size, args.repeat, args.seed)
+        for name, r in report["sizes"][str(size)]["timings"].items():
+            print(f"  {name:30s} median {r['median_ms']:9.3f} ms  p95 {r['p95_ms']:9.3f} ms")
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -1,427 +1,2029 @@
-# Phase 2 — Database layer (SQLite)
-import sqlite3
-from datetime import datetime, timedelta
-
-DB_FILE = "blood_bank.db"
-
-BLOOD_GROUPS = ["O-", "O+", "A-", "A+", "B-", "B+", "AB-", "AB+"]
-
-COMPATIBILITY = {
-    "O-": ["O-"],
-    "O+": ["O-", "O+"],
-    "A-": ["O-", "A-"],
-    "A+": ["O-", "O+", "A-", "A+"],
-    "B-": ["O-", "B-"],
-    "B+": ["O-", "O+", "B-", "B+"],
-    "AB-": ["O-", "A-", "B-", "AB-"],
-    "AB+": ["O-", "O+", "A-", "A+", "B-", "B+", "AB-", "AB+"],
-}
-
-DONATION_EXPIRY_DAYS = 42
-DONOR_ELIGIBILITY_DAYS = 90
-
-def get_conn():
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys = ON")
-    return conn
-
-def init_db():
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.executescript("""
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT UNIQUE NOT NULL,
-        password TEXT NOT NULL,
-        role TEXT NOT NULL CHECK(role IN ('admin','staff')) DEFAULT 'staff'
-    );
-
-    CREATE TABLE IF NOT EXISTS donors (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        age INTEGER NOT NULL CHECK(age > 0),
-        gender TEXT CHECK(gender IN ('Male','Female','Other')),
-        phone TEXT,
-        address TEXT,
-        blood_group TEXT NOT NULL,
-        last_donation_date TEXT
-    );
-
-    CREATE TABLE IF NOT EXISTS recipients (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        age INTEGER NOT NULL CHECK(age > 0),
-        required_blood_group TEXT NOT NULL,
-        quantity_needed INTEGER NOT NULL CHECK(quantity_needed > 0),
-        hospital_name TEXT,
-        created_at TEXT NOT NULL DEFAULT (datetime('now'))
-    );
-
-    CREATE TABLE IF NOT EXISTS donations (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        donor_id INTEGER NOT NULL,
-        donation_code TEXT UNIQUE NOT NULL,
-        blood_group TEXT NOT NULL,
-        units INTEGER NOT NULL CHECK(units > 0),
-        donation_date TEXT NOT NULL,
-        expiry_date TEXT NOT NULL,
-        FOREIGN KEY (donor_id) REFERENCES donors(id) ON DELETE CASCADE
-    );
-
-    CREATE TABLE IF NOT EXISTS inventory (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        blood_group TEXT UNIQUE NOT NULL,
-        available_units INTEGER NOT NULL DEFAULT 0 CHECK(available_units >= 0),
-        updated_at TEXT NOT NULL DEFAULT (datetime('now'))
-    );
-
-    CREATE TABLE IF NOT EXISTS issues (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        recipient_id INTEGER NOT NULL,
-        requested_blood_group TEXT NOT NULL,
-        blood_group_issued TEXT NOT NULL,
-        units INTEGER NOT NULL CHECK(units > 0),
-        issue_date TEXT NOT NULL,
-        compatible INTEGER NOT NULL CHECK(compatible IN (0,1)),
-        status TEXT NOT NULL DEFAULT 'issued',
-        FOREIGN KEY (recipient_id) REFERENCES recipients(id) ON DELETE CASCADE
-    );
-
-    CREATE INDEX IF NOT EXISTS idx_donations_expiry ON donations(expiry_date);
-    CREATE INDEX IF NOT EXISTS idx_issues_date ON issues(issue_date);
-    """)
-    cur.execute("INSERT OR IGNORE INTO users (username, password, role) VALUES ('admin', 'admin123', 'admin')")
-    for bg in BLOOD_GROUPS:
-        cur.execute("INSERT OR IGNORE INTO inventory (blood_group, available_units) VALUES (?, 0)", (bg,))
-    conn.commit()
-    conn.close()
-    recalc_inventory()
-
-def normalize_blood_group(bg: str) -> str:
-    bg = (bg or "").strip().upper()
-    if bg in BLOOD_GROUPS:
-        return bg
-    raise ValueError("Invalid blood group. Allowed: " + ", ".join(BLOOD_GROUPS))
-
-def authenticate(username: str, password: str):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT username, role FROM users WHERE username = ? AND password = ?", (username, password))
-    row = cur.fetchone()
-    conn.close()
-    if row:
-        return True, row["username"], row["role"]
-    return False, None, None
-
-# Donors
-def add_donor(name, age, gender, phone, address, blood_group, last_donation_date=None):
-    bg = normalize_blood_group(blood_group)
-    if last_donation_date:
-        try:
-            datetime.strptime(last_donation_date, "%Y-%m-%d")
-        except ValueError:
-            raise ValueError("last_donation_date must be YYYY-MM-DD")
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO donors (name, age, gender, phone, address, blood_group, last_donation_date)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (name.strip(), int(age), gender, phone, address, bg, last_donation_date))
-    conn.commit()
-    conn.close()
-
-def update_donor(donor_id, **fields):
-    if not fields:
-        return
-    allowed = {"name","age","gender","phone","address","blood_group","last_donation_date"}
-    set_parts = []
-    values = []
-    for k, v in fields.items():
-        if k not in allowed:
-            continue
-        if k == "blood_group":
-            v = normalize_blood_group(v)
-        if k == "age":
-            v = int(v)
-            if v <= 0: raise ValueError("Age must be positive")
-        if k == "last_donation_date" and v:
-            try:
-                datetime.strptime(str(v), "%Y-%m-%d")
-            except ValueError:
-                raise ValueError("last_donation_date must be YYYY-MM-DD")
-        set_parts.append(f"{k} = ?")
-        values.append(v)
-    if not set_parts:
-        return
-    values.append(int(donor_id))
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(f"UPDATE donors SET {', '.join(set_parts)} WHERE id = ?", values)
-    conn.commit()
-    conn.close()
-
-def delete_donor(donor_id):
-    conn = get_conn()
-    conn.execute("DELETE FROM donors WHERE id = ?", (int(donor_id),))
-    conn.commit()
-    conn.close()
-
-def list_donors():
-    conn = get_conn()
-    rows = conn.execute("SELECT * FROM donors ORDER BY name").fetchall()
-    conn.close()
-    return rows
-
-def eligible_donors():
-    conn = get_conn()
-    rows = conn.execute("SELECT * FROM donors").fetchall()
-    conn.close()
-    eligible = []
-    for r in rows:
-        last = r["last_donation_date"]
-        if not last:
-            eligible.append(r)
-            continue
-        try:
-            d = datetime.strptime(str(last), "%Y-%m-%d")
-            if (datetime.now() - d).days >= DONOR_ELIGIBILITY_DAYS:
-                eligible.append(r)
-        except Exception:
-            pass
-    return eligible
-
-# Recipients
-def add_recipient(name, age, required_blood_group, quantity_needed, hospital_name):
-    bg = normalize_blood_group(required_blood_group)
-    conn = get_conn()
-    conn.execute("""
-        INSERT INTO recipients (name, age, required_blood_group, quantity_needed, hospital_name)
-        VALUES (?, ?, ?, ?, ?)
-    """, (name.strip(), int(age), bg, int(quantity_needed), hospital_name))
-    conn.commit()
-    conn.close()
-
-def update_recipient(recipient_id, **fields):
-    allowed = {"name","age","required_blood_group","quantity_needed","hospital_name"}
-    set_parts, values = [], []
-    for k,v in fields.items():
-        if k not in allowed: continue
-        if k == "required_blood_group":
-            v = normalize_blood_group(v)
-        if k in ("age","quantity_needed"):
-            v = int(v)
-            if v <= 0: raise ValueError(f"{k} must be positive")
-        set_parts.append(f"{k} = ?")
-        values.append(v)
-    if not set_parts:
-        return
-    values.append(int(recipient_id))
-    conn = get_conn()
-    conn.execute(f"UPDATE recipients SET {', '.join(set_parts)} WHERE id = ?", values)
-    conn.commit()
-    conn.close()
-
-def delete_recipient(recipient_id):
-    conn = get_conn()
-    conn.execute("DELETE FROM recipients WHERE id = ?", (int(recipient_id),))
-    conn.commit()
-    conn.close()
-
-def list_recipients():
-    conn = get_conn()
-    rows = conn.execute("SELECT * FROM recipients ORDER BY created_at DESC").fetchall()
-    conn.close()
-    return rows
-
-# Donations and Inventory
-def record_donation(donor_id, blood_group, units, donation_date=None):
-    bg = normalize_blood_group(blood_group)
-    units = int(units)
-    if units <= 0: raise ValueError("Units must be positive")
-    donor_id = int(donor_id)
-    now = datetime.now() if not donation_date else datetime.strptime(donation_date, "%Y-%m-%d")
-    expiry = now + timedelta(days=DONATION_EXPIRY_DAYS)
-    donation_code = f"D-{now.strftime('%Y%m%d%H%M%S')}-{donor_id}"
-    conn = get_conn()
-    cur = conn.cursor()
-    d = cur.execute("SELECT id FROM donors WHERE id = ?", (donor_id,)).fetchone()
-    if not d:
-        conn.close()
-        raise ValueError("Donor not found")
-    cur.execute("""
-        INSERT INTO donations (donor_id, donation_code, blood_group, units, donation_date, expiry_date)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (donor_id, donation_code, bg, units, now.strftime("%Y-%m-%d %H:%M:%S"), expiry.strftime("%Y-%m-%d %H:%M:%S")))
-    cur.execute("UPDATE donors SET last_donation_date = ? WHERE id = ?", (now.strftime("%Y-%m-%d"), donor_id))
-    conn.commit()
-    conn.close()
-    recalc_inventory()
-    return donation_code
-
-def recalc_inventory():
-    conn = get_conn()
-    cur = conn.cursor()
-    now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    for bg in BLOOD_GROUPS:
-        donated = cur.execute("""
-            SELECT COALESCE(SUM(units),0) AS total
-            FROM donations
-            WHERE blood_group = ?
-              AND expiry_date >= ?
-        """, (bg, now_str)).fetchone()["total"]
-        issued = cur.execute("""
-            SELECT COALESCE(SUM(units),0) AS total
-            FROM issues
-            WHERE blood_group_issued = ?
-        """, (bg,)).fetchone()["total"]
-        available = max(0, int(donated) - int(issued))
-        cur.execute("UPDATE inventory SET available_units = ?, updated_at = ? WHERE blood_group = ?",
-                    (available, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), bg))
-    conn.commit()
-    conn.close()
-
-def list_inventory():
-    recalc_inventory()
-    conn = get_conn()
-    rows = conn.execute("SELECT blood_group, available_units, updated_at FROM inventory ORDER BY blood_group").fetchall()
-    conn.close()
-    return rows
-
-def low_stock_alerts(threshold=5):
-    rows = list_inventory()
-    low = []
-    out = []
-    for r in rows:
-        if r["available_units"] == 0:
-            out.append(r)
-        elif r["available_units"] < threshold:
-            low.append(r)
-    return low, out
-
-def record_issue(recipient_id, requested_blood_group, units):
-    recipient_id = int(recipient_id)
-    units = int(units)
-    if units <= 0: raise ValueError("Units must be positive")
-    requested = normalize_blood_group(requested_blood_group)
-    conn = get_conn()
-    cur = conn.cursor()
-    rec = cur.execute("SELECT * FROM recipients WHERE id = ?", (recipient_id,)).fetchone()
-    if not rec:
-        conn.close()
-        raise ValueError("Recipient not found")
-    recalc_inventory()
-    candidates = [requested] + [g for g in COMPATIBILITY[requested] if g != requested]
-    issued_group = None
-    for g in candidates:
-        inv = cur.execute("SELECT available_units FROM inventory WHERE blood_group = ?", (g,)).fetchone()
-        if inv and inv["available_units"] >= units:
-            issued_group = g
-            break
-    compatible_flag = 1 if issued_group in COMPATIBILITY[requested] else 0
-    if not issued_group:
-        conn.close()
-        raise ValueError("Insufficient compatible stock.")
-    cur.execute("""
-        INSERT INTO issues (recipient_id, requested_blood_group, blood_group_issued, units, issue_date, compatible, status)
-        VALUES (?, ?, ?, ?, ?, ?, 'issued')
-    """, (recipient_id, requested, issued_group, units, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), compatible_flag))
-    conn.commit()
-    conn.close()
-    recalc_inventory()
-    return issued_group
-
-# Search & Reports
-def search_donors(term=None, blood_group=None, location=None):
-    term = (term or "").strip()
-    location = (location or "").strip()
-    params = []
-    query = "SELECT * FROM donors WHERE 1=1"
-    if term:
-        query += " AND (name LIKE ? OR phone LIKE ?)"
-        params += [f"%{term}%", f"%{term}%"]
-    if blood_group:
-        bg = normalize_blood_group(blood_group)
-        query += " AND blood_group = ?"
-        params.append(bg)
-    if location:
-        query += " AND address LIKE ?"
-        params.append(f"%{location}%")
-    query += " ORDER BY name"
-    conn = get_conn()
-    rows = conn.execute(query, params).fetchall()
-    conn.close()
-    return rows
-
-def search_inventory(blood_group=None):
-    recalc_inventory()
-    conn = get_conn()
-    if blood_group:
-        bg = normalize_blood_group(blood_group)
-        rows = conn.execute("SELECT * FROM inventory WHERE blood_group = ?", (bg,)).fetchall()
-    else:
-        rows = conn.execute("SELECT * FROM inventory ORDER BY blood_group").fetchall()
-    conn.close()
-    return rows
-
-def report_totals():
-    conn = get_conn()
-    donors_total = conn.execute("SELECT COUNT(*) AS c FROM donors").fetchone()["c"]
-    recalc_inventory()
-    units_total = conn.execute("SELECT COALESCE(SUM(available_units),0) AS c FROM inventory").fetchone()["c"]
-    conn.close()
-    return donors_total, units_total
-
-def report_most_requested_group():
-    conn = get_conn()
-    row = conn.execute("""
-        SELECT requested_blood_group AS g, COUNT(*) AS cnt
-        FROM issues
-        GROUP BY requested_blood_group
-        ORDER BY cnt DESC
-        LIMIT 1
-    """).fetchone()
-    conn.close()
-    if row:
-        return row["g"], row["cnt"]
-    return None, 0
-
-def report_most_donated_group():
-    conn = get_conn()
-    row = conn.execute("""
-        SELECT blood_group AS g, COALESCE(SUM(units),0) AS cnt
-        FROM donations
-        GROUP BY blood_group
-        ORDER BY cnt DESC
-        LIMIT 1
-    """).fetchone()
-    conn.close()
-    if row:
-        return row["g"], row["cnt"]
-    return None, 0
-
-def report_daily_donations():
-    conn = get_conn()
-    rows = conn.execute("""
-        SELECT date(donation_date) AS day, COALESCE(SUM(units),0) AS units
-        FROM donations
-        GROUP BY date(donation_date)
-        ORDER BY day DESC
-    """).fetchall()
-    conn.close()
-    return rows
-
-def report_monthly_donations():
-    conn = get_conn()
-    rows = conn.execute("""
-        SELECT strftime('%Y-%m', donation_date) AS month, COALESCE(SUM(units),0) AS units
-        FROM donations
-        GROUP BY strftime('%Y-%m', donation_date)
-        ORDER BY month DESC
-    """).fetchall()
-    conn.close()
-    return rows
-
-def match_compatible_donors(required_group):
-    groups = COMPATIBILITY[normalize_blood_group(required_group)]
-    return [d for d in list_donors() if d["blood_group"] in groups]
\ No newline at end of file
+# Phase 2 — Database layer (SQLite)
+import csv
+import functools
+import heapq
+import inspect
+import itertools
+import json
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from donation_codes import new_donation_code
+import forecast
+import instrumentation
+
+DB_FILE = "blood_bank.db"
+
+BLOOD_GROUPS = ["O-", "O+", "A-", "A+", "B-", "B+", "AB-", "AB+"]
+
+COMPATIBILITY = {
+    "O-": ["O-"],
+    "O+": ["O-", "O+"],
+    "A-": ["O-", "A-"],
+    "A+": ["O-", "O+", "A-", "A+"],
+    "B-": ["O-", "B-"],
+    "B+": ["O-", "O+", "B-", "B+"],
+    "AB-": ["O-", "A-", "B-", "AB-"],
+    "AB+": ["O-", "O+", "A-", "A+", "B-", "B+", "AB-", "AB+"],
+}
+
+DONATION_EXPIRY_DAYS = 42
+DONOR_ELIGIBILITY_DAYS = 90
+
+BUSY_TIMEOUT_MS = 5000
+STATEMENT_CACHE_SIZE = 256
+
+# Storage encoding (schema v2)
+# Blood groups are stored as their index in BLOOD_GROUPS, days as days since 1970-01-01
+# and timestamps as seconds since 1970-01-01 00:00, counted in the same wall-clock time
+# the v1 TEXT columns held, so date(x, 'unixepoch') gives back the original day.
+# Queries that hand rows to callers decode them to the v1 TEXT shapes.
+SCHEMA_VERSION = 2
+MIGRATE_CHUNK_SIZE = 20000
+BG_CODE = {g: i for i, g in enumerate(BLOOD_GROUPS)}
+# Bit d of COMPAT_MASK[r] is set when blood group code d can be given to group r.
+COMPAT_MASK = {r: sum(1 << BG_CODE[d] for d in groups) for r, groups in COMPATIBILITY.items()}
+_EPOCH = datetime(1970, 1, 1)
+
+def _ts(dt):
+    return int((dt - _EPOCH).total_seconds())
+
+def _day(dt):
+    return (dt - _EPOCH).days
+
+def _parse_day(value):
+    return _day(datetime.strptime(value, "%Y-%m-%d"))
+
+def _bg_sql(column):
+    return f"CASE {column}" + "".join(f" WHEN {i} THEN '{g}'" for i, g in enumerate(BLOOD_GROUPS)) + " END"
+
+def _day_sql(column):
+    return f"date({column} * 86400, 'unixepoch')"
+
+def _ts_sql(column):
+    return f"datetime({column}, 'unixepoch')"
+
+_DONOR_COLUMNS = f"""donors.id, donors.name, donors.age, donors.gender, donors.phone, donors.address,
+    {_bg_sql("donors.blood_group")} AS blood_group, {_day_sql("donors.last_donation_date")} AS last_donation_date,
+    CASE donors.next_eligible_date WHEN 0 THEN '' ELSE {_day_sql("donors.next_eligible_date")} END AS next_eligible_date"""
+_RECIPIENT_COLUMNS = f"""id, name, age, {_bg_sql("required_blood_group")} AS required_blood_group, quantity_needed,
+    hospital_name, {_ts_sql("created_at")} AS created_at"""
+_DONATION_COLUMNS = f"""id, donor_id, donation_code, {_bg_sql("blood_group")} AS blood_group, units,
+    {_ts_sql("donation_date")} AS donation_date, {_ts_sql("expiry_date")} AS expiry_date, remaining_units"""
+_ISSUE_COLUMNS = f"""id, recipient_id, {_bg_sql("requested_blood_group")} AS requested_blood_group,
+    {_bg_sql("blood_group_issued")} AS blood_group_issued, units, {_ts_sql("issue_date")} AS issue_date, compatible, status"""
+# Donations made by real donors; migrated Phase 1 stock is held by synthetic donors.
+DONATED_SQL = "donor_id NOT IN (SELECT id FROM donors WHERE synthetic)"
+_INVENTORY_COLUMNS = f"id, {_bg_sql('blood_group')} AS blood_group, available_units, {_ts_sql('updated_at')} AS updated_at"
+
+# Connections
+# Each thread keeps one configured connection to DB_FILE and reuses it for every call.
+# WAL lets readers (GUI, web front end) proceed while a writer holds the lock.
+_local = threading.local()
+
+class PooledConnection(sqlite3.Connection):
+    def close(self):
+        # Hand the connection back to its thread instead of closing it.
+        if self.in_transaction and not getattr(_local, "depth", 0):
+            self.rollback()
+
+    def dispose(self):
+        super().close()
+
+class InstrumentedConnection(PooledConnection):
+    # Used instead of PooledConnection while instrumentation is enabled.
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            METRICS.observe_sql(sql, parameters, time.perf_counter() - start, self.last_statement)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            METRICS.observe_sql(sql, "<many>", time.perf_counter() - start)
+
+    def _trace(self, statement):
+        # Expanded text, bound parameters included, for the slow-query log.
+        self.last_statement = statement
+        METRICS.count_statement()
+
+_conn_factory = PooledConnection
+_conn_serial = itertools.count(1)
+
+def _open_conn():
+    conn = sqlite3.connect(DB_FILE, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None,
+                           cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False,
+                           factory=_conn_factory)
+    conn.row_factory = sqlite3.Row
+    # Identifies this connection in cache keys; id() can be reused once it is closed.
+    conn.serial = next(_conn_serial)
+    if _conn_factory is InstrumentedConnection:
+        conn.last_statement = None
+        conn.set_trace_callback(conn._trace)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
+def get_conn():
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.db_file != DB_FILE or (type(conn) is not _conn_factory and not _local.depth):
+        close_conn()
+        conn = _local.conn = _open_conn()
+        _local.db_file = DB_FILE
+        _local.depth = 0
+        _local.inventory = None
+    return conn
+
+def close_conn():
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.dispose()
+        _local.conn = None
+    # PRAGMA data_version and total_changes restart with the next connection.
+    _local.inventory = None
+
+@contextmanager
+def transaction(immediate=True):
+    # Nested calls join the outer transaction through savepoints, so several
+    # operations can share one connection and one commit. Transactions take the write
+    # lock up front (BEGIN IMMEDIATE): under WAL a deferred transaction that reads and
+    # then writes fails with SQLITE_BUSY_SNAPSHOT if another writer committed in
+    # between, which busy_timeout cannot wait out. Pass immediate=False only for
+    # transactions that never write.
+    conn = get_conn()
+    depth = _local.depth
+    if depth:
+        conn.execute(f"SAVEPOINT sp{depth}")
+    else:
+        conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+    _local.depth = depth + 1
+    try:
+        yield conn
+    except BaseException:
+        _local.depth = depth
+        if depth:
+            conn.execute(f"ROLLBACK TO sp{depth}")
+            conn.execute(f"RELEASE sp{depth}")
+        else:
+            conn.rollback()
+        raise
+    _local.depth = depth
+    if depth:
+        conn.execute(f"RELEASE sp{depth}")
+    else:
+        conn.commit()
+
+# Writers that lose the race for the write lock past busy_timeout are retried a few
+# times with jittered exponential backoff. Only the outermost call retries; inside an
+# enclosing transaction the error propagates to its owner.
+BUSY_RETRIES = 5
+BUSY_BACKOFF_S = 0.05
+
+def _is_busy(e):
+    code = getattr(e, "sqlite_errorcode", None)
+    if code is not None:
+        return code in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    return "locked" in str(e) or "busy" in str(e)
+
+def retry_on_busy(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        for attempt in range(BUSY_RETRIES + 1):
+            try:
+                return func(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if attempt == BUSY_RETRIES or getattr(_local, "depth", 0) or not _is_busy(e):
+                    raise
+                time.sleep(BUSY_BACKOFF_S * (2 ** attempt) * (0.5 + random.random()))
+    return wrapper
+
+def init_db(migrate_chunk_size=MIGRATE_CHUNK_SIZE, progress=None):
+    conn = get_conn()
+    v1_tables = _set_aside_v1(conn)
+    conn.executescript("""
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        role TEXT NOT NULL CHECK(role IN ('admin','staff')) DEFAULT 'staff'
+    );
+
+    CREATE TABLE IF NOT EXISTS donors (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        age INTEGER NOT NULL CHECK(age > 0),
+        gender TEXT CHECK(gender IN ('Male','Female','Other')),
+        phone TEXT,
+        address TEXT,
+        blood_group INTEGER NOT NULL,
+        last_donation_date INTEGER,
+        next_eligible_date INTEGER NOT NULL DEFAULT 0,
+        synthetic INTEGER NOT NULL DEFAULT 0
+    );
+
+    CREATE TABLE IF NOT EXISTS recipients (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        age INTEGER NOT NULL CHECK(age > 0),
+        required_blood_group INTEGER NOT NULL,
+        quantity_needed INTEGER NOT NULL CHECK(quantity_needed > 0),
+        hospital_name TEXT,
+        created_at INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+        synthetic INTEGER NOT NULL DEFAULT 0
+    );
+
+    CREATE TABLE IF NOT EXISTS donations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        donor_id INTEGER NOT NULL,
+        donation_code TEXT UNIQUE NOT NULL,
+        blood_group INTEGER NOT NULL,
+        units INTEGER NOT NULL CHECK(units > 0),
+        donation_date INTEGER NOT NULL,
+        expiry_date INTEGER NOT NULL,
+        remaining_units INTEGER NOT NULL DEFAULT 0 CHECK(remaining_units >= 0),
+        FOREIGN KEY (donor_id) REFERENCES donors(id) ON DELETE CASCADE
+    );
+
+    CREATE TABLE IF NOT EXISTS inventory (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        blood_group INTEGER UNIQUE NOT NULL,
+        available_units INTEGER NOT NULL DEFAULT 0 CHECK(available_units >= 0),
+        updated_at INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER))
+    );
+
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+
+    CREATE TABLE IF NOT EXISTS issues (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        recipient_id INTEGER NOT NULL,
+        requested_blood_group INTEGER NOT NULL,
+        blood_group_issued INTEGER NOT NULL,
+        units INTEGER NOT NULL CHECK(units > 0),
+        issue_date INTEGER NOT NULL,
+        compatible INTEGER NOT NULL CHECK(compatible IN (0,1)),
+        status TEXT NOT NULL DEFAULT 'issued',
+        FOREIGN KEY (recipient_id) REFERENCES recipients(id) ON DELETE CASCADE
+    );
+
+    CREATE TABLE IF NOT EXISTS issue_allocations (
+        issue_id INTEGER NOT NULL,
+        donation_id INTEGER NOT NULL,
+        units INTEGER NOT NULL CHECK(units > 0),
+        PRIMARY KEY (issue_id, donation_id),
+        FOREIGN KEY (issue_id) REFERENCES issues(id) ON DELETE CASCADE,
+        FOREIGN KEY (donation_id) REFERENCES donations(id) ON DELETE CASCADE
+    );
+
+    CREATE TABLE IF NOT EXISTS wastage (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        donation_id INTEGER NOT NULL,
+        blood_group INTEGER NOT NULL,
+        units INTEGER NOT NULL CHECK(units > 0),
+        expiry_date INTEGER NOT NULL,
+        retired_at INTEGER NOT NULL
+    );
+
+    -- Per-day, per-group totals for the reports; issues are keyed by requested group.
+    CREATE TABLE IF NOT EXISTS donation_rollup (
+        day INTEGER NOT NULL,
+        blood_group INTEGER NOT NULL,
+        units INTEGER NOT NULL DEFAULT 0,
+        entries INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, blood_group)
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS issue_rollup (
+        day INTEGER NOT NULL,
+        blood_group INTEGER NOT NULL,
+        units INTEGER NOT NULL DEFAULT 0,
+        entries INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, blood_group)
+    ) WITHOUT ROWID;
+
+    -- One row per archive partition table, with the bounds of its date column.
+    CREATE TABLE IF NOT EXISTS archive_catalog (
+        table_name TEXT PRIMARY KEY,
+        kind TEXT NOT NULL CHECK(kind IN ('donations','issues','allocations')),
+        month TEXT NOT NULL,
+        first_at INTEGER NOT NULL,
+        last_at INTEGER NOT NULL,
+        rows INTEGER NOT NULL DEFAULT 0
+    );
+
+    -- Units issued to each recipient by issues that have been archived.
+    CREATE TABLE IF NOT EXISTS issue_carry (
+        recipient_id INTEGER PRIMARY KEY,
+        units INTEGER NOT NULL DEFAULT 0,
+        entries INTEGER NOT NULL DEFAULT 0,
+        FOREIGN KEY (recipient_id) REFERENCES recipients(id) ON DELETE CASCADE
+    );
+    """)
+    _migrate(conn, v1_tables, migrate_chunk_size, progress)
+    if not _has_column(conn, "donors", "synthetic"):
+        _add_synthetic_flag(conn)
+    if not _has_column(conn, "recipients", "synthetic"):
+        _add_synthetic_recipient_flag(conn)
+    conn.executescript(f"""
+    CREATE INDEX IF NOT EXISTS idx_donations_expiry ON donations(expiry_date);
+    CREATE INDEX IF NOT EXISTS idx_issues_date ON issues(issue_date);
+    CREATE INDEX IF NOT EXISTS idx_donations_date ON donations(donation_date);
+    CREATE INDEX IF NOT EXISTS idx_donations_lots ON donations(blood_group, expiry_date) WHERE remaining_units > 0;
+    CREATE INDEX IF NOT EXISTS idx_allocations_donation ON issue_allocations(donation_id);
+    CREATE INDEX IF NOT EXISTS idx_issues_recipient ON issues(recipient_id);
+    CREATE INDEX IF NOT EXISTS idx_wastage_expiry ON wastage(expiry_date);
+    CREATE INDEX IF NOT EXISTS idx_donors_name_phone ON donors(name, phone);
+    CREATE INDEX IF NOT EXISTS idx_donors_group_eligible ON donors(blood_group, next_eligible_date);
+
+    -- next_eligible_date is 0 for donors who never donated, so they sort first.
+    CREATE TRIGGER IF NOT EXISTS trg_donors_eligible_insert AFTER INSERT ON donors BEGIN
+        UPDATE donors SET next_eligible_date = COALESCE(NEW.last_donation_date + {DONOR_ELIGIBILITY_DAYS}, 0)
+        WHERE id = NEW.id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_donors_eligible_update AFTER UPDATE OF last_donation_date ON donors BEGIN
+        UPDATE donors SET next_eligible_date = COALESCE(NEW.last_donation_date + {DONOR_ELIGIBILITY_DAYS}, 0)
+        WHERE id = NEW.id;
+    END;
+    """)
+    _init_donor_search(conn)
+    with transaction() as conn:
+        conn.execute("INSERT OR IGNORE INTO users (username, password, role) VALUES ('admin', 'admin123', 'admin')")
+        for bg in BLOOD_GROUPS:
+            conn.execute("INSERT OR IGNORE INTO inventory (blood_group, available_units) VALUES (?, 0)", (BG_CODE[bg],))
+    built = conn.execute("SELECT 1 FROM meta WHERE key = 'inventory_expired_through'").fetchone()
+    if not built:
+        # First run against this file: build the ledger once from history.
+        recalc_inventory()
+    if not conn.execute("SELECT 1 FROM meta WHERE key = 'rollups_built'").fetchone():
+        backfill_rollups()
+
+def _has_column(conn, table, column):
+    return any(r["name"] == column for r in conn.execute(f"PRAGMA table_info({table})"))
+
+def _add_synthetic_flag(conn):
+    # Donors that only hold migrated Phase 1 stock (see migrate_phase1) are flagged so
+    # donor lists, eligibility and the donation reports leave them out.
+    with transaction() as conn:
+        conn.execute("ALTER TABLE donors ADD COLUMN synthetic INTEGER NOT NULL DEFAULT 0")
+        flagged = conn.execute("UPDATE donors SET synthetic = 1 WHERE name LIKE ? AND phone IS NULL",
+                               (PHASE1_DONOR + " %",)).rowcount
+        if flagged:
+            conn.execute("DELETE FROM meta WHERE key = 'rollups_built'")
+
+def _add_synthetic_recipient_flag(conn):
+    # Likewise for the recipients that hold migrated Phase 1 requests.
+    with transaction() as conn:
+        conn.execute("ALTER TABLE recipients ADD COLUMN synthetic INTEGER NOT NULL DEFAULT 0")
+        conn.execute("UPDATE recipients SET synthetic = 1 WHERE name LIKE ? AND hospital_name = 'Phase 1'",
+                     (PHASE1_RECIPIENT + " %",))
+
+# Schema migration (tracked in PRAGMA user_version)
+# v1 tables are renamed to <table>_v1 before the v2 tables are created, then copied
+# across in id order, MIGRATE_CHUNK_SIZE rows per transaction. An interrupted run
+# resumes from the last copied id. Inventory and the rollups are rebuilt rather than
+# copied. Run it with the application stopped (python database.py migrate).
+_V1_MARKERS = {"donors": "blood_group", "recipients": "required_blood_group", "donations": "blood_group",
+               "issues": "blood_group_issued", "inventory": "blood_group", "wastage": "blood_group",
+               "donation_rollup": "blood_group", "issue_rollup": "blood_group"}
+_V1_REBUILT = ("inventory", "donation_rollup", "issue_rollup")
+
+def _bg_code_sql(column):
+    return f"CASE {column}" + "".join(f" WHEN '{g}' THEN {i}" for i, g in enumerate(BLOOD_GROUPS)) + " END"
+
+def _day_code_sql(column):
+    return f"CAST(julianday({column}) - 2440587.5 AS INTEGER)"
+
+def _ts_code_sql(column):
+    return f"CAST(strftime('%s', {column}) AS INTEGER)"
+
+def _v1_copy(conn):
+    remaining = "remaining_units" if _has_column(conn, "donations_v1", "remaining_units") else "units"
+    return {
+        "donors": ("id, name, age, gender, phone, address, blood_group, last_donation_date, next_eligible_date",
+                   f"""id, name, age, gender, phone, address, {_bg_code_sql("blood_group")},
+                   {_day_code_sql("last_donation_date")},
+                   COALESCE({_day_code_sql("last_donation_date")} + {DONOR_ELIGIBILITY_DAYS}, 0)"""),
+        "recipients": ("id, name, age, required_blood_group, quantity_needed, hospital_name, created_at",
+                       f"""id, name, age, {_bg_code_sql("required_blood_group")}, quantity_needed, hospital_name,
+                       {_ts_code_sql("created_at")}"""),
+        "donations": ("id, donor_id, donation_code, blood_group, units, donation_date, expiry_date, remaining_units",
+                      f"""id, donor_id, donation_code, {_bg_code_sql("blood_group")}, units,
+                      {_ts_code_sql("donation_date")}, {_ts_code_sql("expiry_date")}, {remaining}"""),
+        "issues": ("id, recipient_id, requested_blood_group, blood_group_issued, units, issue_date, compatible, status",
+                   f"""id, recipient_id, {_bg_code_sql("requested_blood_group")}, {_bg_code_sql("blood_group_issued")},
+                   units, {_ts_code_sql("issue_date")}, compatible, status"""),
+        "wastage": ("id, donation_id, blood_group, units, expiry_date, retired_at",
+                    f"""id, donation_id, {_bg_code_sql("blood_group")}, units, {_ts_code_sql("expiry_date")},
+                    {_ts_code_sql("retired_at")}"""),
+    }
+
+def _table_exists(conn, table):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone() is not None
+
+def _set_aside_v1(conn):
+    # Returns the tables that still have v1 data waiting in <table>_v1.
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        return []
+    pending = []
+    for table, column in _V1_MARKERS.items():
+        if _table_exists(conn, table + "_v1"):
+            pending.append(table)
+        elif _table_exists(conn, table):
+            kind = next((r["type"] for r in conn.execute(f"PRAGMA table_info({table})") if r["name"] == column), "")
+            if kind.upper() == "TEXT":
+                pending.append(table)
+    if pending:
+        # Keep other tables' foreign keys pointing at the names, not the renamed v1 tables.
+        conn.execute("PRAGMA foreign_keys = OFF")
+        conn.execute("PRAGMA legacy_alter_table = ON")
+        with transaction() as conn:
+            for table in pending:
+                if not _table_exists(conn, table + "_v1"):
+                    conn.execute(f"ALTER TABLE {table} RENAME TO {table}_v1")
+        conn.execute("PRAGMA legacy_alter_table = OFF")
+    return pending
+
+def _migrate(conn, v1_tables, chunk_size=MIGRATE_CHUNK_SIZE, progress=None):
+    if v1_tables:
+        copies = _v1_copy(conn)
+        replay = "donations" in v1_tables and not _has_column(conn, "donations_v1", "remaining_units")
+        for table in v1_tables:
+            if table in _V1_REBUILT:
+                continue
+            columns, exprs = copies[table]
+            total = conn.execute(f"SELECT COUNT(*) FROM {table}_v1").fetchone()[0]
+            while True:
+                with transaction() as conn:
+                    last = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+                    copied = conn.execute(f"""
+                        INSERT INTO {table} ({columns})
+                        SELECT {exprs} FROM {table}_v1 WHERE id > ? ORDER BY id LIMIT ?
+                    """, (last, int(chunk_size))).rowcount
+                if progress:
+                    progress(f"{table}: {conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]}/{total} rows")
+                if copied < chunk_size:
+                    break
+        with transaction() as conn:
+            if replay:
+                # Lots predating lot tracking start full; past issues are replayed against them.
+                _replay_allocations(conn)
+            for table in v1_tables:
+                conn.execute(f"DROP TABLE {table}_v1")
+            conn.execute("DELETE FROM meta WHERE key IN ('inventory_expired_through', 'rollups_built')")
+        conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+# Full-text donor search over name, phone and address. The trigram tokenizer gives
+# case-insensitive substring matches for terms of 3+ characters; builds of SQLite
+# without FTS5 fall back to LIKE scans.
+FTS_MIN_TERM = 3
+_fts_enabled = False
+
+def _init_donor_search(conn):
+    global _fts_enabled
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'donors_fts'").fetchone()
+    try:
+        with transaction() as conn:
+            conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS donors_fts USING fts5(
+                    name, phone, address, content='donors', content_rowid='id', tokenize='trigram')
+            """)
+            for stmt in ("""
+                CREATE TRIGGER IF NOT EXISTS trg_donors_fts_insert AFTER INSERT ON donors BEGIN
+                    INSERT INTO donors_fts (rowid, name, phone, address) VALUES (NEW.id, NEW.name, NEW.phone, NEW.address);
+                END""", """
+                CREATE TRIGGER IF NOT EXISTS trg_donors_fts_delete AFTER DELETE ON donors BEGIN
+                    INSERT INTO donors_fts (donors_fts, rowid, name, phone, address)
+                    VALUES ('delete', OLD.id, OLD.name, OLD.phone, OLD.address);
+                END""", """
+                CREATE TRIGGER IF NOT EXISTS trg_donors_fts_update AFTER UPDATE OF name, phone, address ON donors BEGIN
+                    INSERT INTO donors_fts (donors_fts, rowid, name, phone, address)
+                    VALUES ('delete', OLD.id, OLD.name, OLD.phone, OLD.address);
+                    INSERT INTO donors_fts (rowid, name, phone, address) VALUES (NEW.id, NEW.name, NEW.phone, NEW.address);
+                END"""):
+                conn.execute(stmt)
+            if not exists:
+                conn.execute("INSERT INTO donors_fts (donors_fts) VALUES ('rebuild')")
+        _fts_enabled = True
+    except sqlite3.OperationalError:
+        _fts_enabled = False
+
+def _fts_phrase(text):
+    return '"' + text.replace('"', '""') + '"'
+
+def normalize_blood_group(bg: str) -> str:
+    bg = (bg or "").strip().upper()
+    if bg in BLOOD_GROUPS:
+        return bg
+    raise ValueError("Invalid blood group. Allowed: " + ", ".join(BLOOD_GROUPS))
+
+def check_date(value, field):
+    try:
+        datetime.strptime(str(value), "%Y-%m-%d")
+    except ValueError:
+        raise ValueError(f"{field} must be YYYY-MM-DD")
+
+def authenticate(username: str, password: str):
+    row = get_conn().execute("SELECT username, role FROM users WHERE username = ? AND password = ?",
+                             (username, password)).fetchone()
+    if row:
+        return True, row["username"], row["role"]
+    return False, None, None
+
+# Donors
+def add_donor(name, age, gender, phone, address, blood_group, last_donation_date=None):
+    bg = normalize_blood_group(blood_group)
+    if last_donation_date:
+        check_date(last_donation_date, "last_donation_date")
+    with transaction() as conn:
+        conn.execute("""
+            INSERT INTO donors (name, age, gender, phone, address, blood_group, last_donation_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (name.strip(), int(age), gender, phone, address, BG_CODE[bg],
+              _parse_day(last_donation_date) if last_donation_date else None))
+
+def update_donor(donor_id, **fields):
+    if not fields:
+        return
+    allowed = {"name","age","gender","phone","address","blood_group","last_donation_date"}
+    set_parts = []
+    values = []
+    for k, v in fields.items():
+        if k not in allowed:
+            continue
+        if k == "blood_group":
+            v = BG_CODE[normalize_blood_group(v)]
+        if k == "age":
+            v = int(v)
+            if v <= 0: raise ValueError("Age must be positive")
+        if k == "last_donation_date":
+            if v:
+                check_date(v, "last_donation_date")
+            v = _parse_day(v) if v else None
+        set_parts.append(f"{k} = ?")
+        values.append(v)
+    if not set_parts:
+        return
+    values.append(int(donor_id))
+    with transaction() as conn:
+        conn.execute(f"UPDATE donors SET {', '.join(set_parts)} WHERE id = ?", values)
+
+def delete_donor(donor_id):
+    with transaction() as conn:
+        # Donations cascade with the donor, so take their remaining units out of stock first.
+        live = conn.execute("""
+            SELECT blood_group, SUM(remaining_units) AS total
+            FROM donations
+            WHERE donor_id = ? AND remaining_units > 0
+            GROUP BY blood_group
+        """, (int(donor_id),)).fetchall()
+        for r in live:
+            _adjust_inventory(conn, r["blood_group"], -r["total"])
+        for r in conn.execute(f"""
+            SELECT donation_date / 86400 AS day, blood_group, SUM(units) AS units, COUNT(*) AS entries
+            FROM donations WHERE donor_id = ? AND {DONATED_SQL} GROUP BY 1, 2
+        """, (int(donor_id),)).fetchall():
+            _bump_rollup(conn, "donation_rollup", r["day"], r["blood_group"], -r["units"], -r["entries"])
+        conn.execute("DELETE FROM donors WHERE id = ?", (int(donor_id),))
+
+def list_donors():
+    return get_conn().execute(f"SELECT {_DONOR_COLUMNS} FROM donors WHERE NOT donors.synthetic ORDER BY donors.name").fetchall()
+
+def _today():
+    return _day(datetime.now())
+
+def eligible_donors():
+    return get_conn().execute(f"SELECT {_DONOR_COLUMNS} FROM donors WHERE donors.next_eligible_date <= ? AND NOT donors.synthetic",
+                              (_today(),)).fetchall()
+
+def match_eligible_donors(required_group, location=None, limit=50, after=None):
+    # Donors who can give to required_group today, longest since last donation first.
+    # Each compatible group is read in index order and the streams are merged, so a
+    # page costs O(groups * limit) rows. Pass the returned cursor as `after` for the next page.
+    groups = COMPATIBILITY[normalize_blood_group(required_group)]
+    location = (location or "").strip()
+    after = tuple(after) if after else ("", 0)
+    after_day = _parse_day(after[0]) if after[0] else 0
+    query = f"""
+        SELECT {_DONOR_COLUMNS} FROM donors
+        WHERE donors.blood_group = ? AND donors.next_eligible_date <= ? AND NOT donors.synthetic
+          AND (donors.next_eligible_date > ? OR (donors.next_eligible_date = ? AND donors.id > ?))
+    """
+    if location:
+        query += " AND donors.address LIKE ?"
+    query += " ORDER BY donors.next_eligible_date, donors.id LIMIT ?"
+    conn = get_conn()
+    streams = []
+    for g in groups:
+        params = [BG_CODE[g], _today(), after_day, after_day, after[1]]
+        if location:
+            params.append(f"%{location}%")
+        streams.append(conn.execute(query, params + [int(limit)]).fetchall())
+    rows = list(heapq.merge(*streams, key=lambda r: (r["next_eligible_date"], r["id"])))[:int(limit)]
+    cursor = (rows[-1]["next_eligible_date"], rows[-1]["id"]) if len(rows) == int(limit) else None
+    return rows, cursor
+
+# Recipients
+def add_recipient(name, age, required_blood_group, quantity_needed, hospital_name):
+    bg = normalize_blood_group(required_blood_group)
+    with transaction() as conn:
+        conn.execute("""
+            INSERT INTO recipients (name, age, required_blood_group, quantity_needed, hospital_name)
+            VALUES (?, ?, ?, ?, ?)
+        """, (name.strip(), int(age), BG_CODE[bg], int(quantity_needed), hospital_name))
+
+def update_recipient(recipient_id, **fields):
+    allowed = {"name","age","required_blood_group","quantity_needed","hospital_name"}
+    set_parts, values = [], []
+    for k,v in fields.items():
+        if k not in allowed: continue
+        if k == "required_blood_group":
+            v = BG_CODE[normalize_blood_group(v)]
+        if k in ("age","quantity_needed"):
+            v = int(v)
+            if v <= 0: raise ValueError(f"{k} must be positive")
+        set_parts.append(f"{k} = ?")
+        values.append(v)
+    if not set_parts:
+        return
+    values.append(int(recipient_id))
+    with transaction() as conn:
+        conn.execute(f"UPDATE recipients SET {', '.join(set_parts)} WHERE id = ?", values)
+
+def delete_recipient(recipient_id):
+    with transaction() as conn:
+        # Issues cascade with the recipient; units drawn from lots that are still live go back into them.
+        returned = conn.execute("""
+            SELECT a.donation_id, a.units, d.blood_group
+            FROM issues i
+            JOIN issue_allocations a ON a.issue_id = i.id
+            JOIN donations d ON d.id = a.donation_id
+            WHERE i.recipient_id = ? AND d.expiry_date >= ?
+        """, (int(recipient_id), _apply_expiries(conn))).fetchall()
+        conn.executemany("UPDATE donations SET remaining_units = remaining_units + ? WHERE id = ?",
+                         [(r["units"], r["donation_id"]) for r in returned])
+        for r in returned:
+            _adjust_inventory(conn, r["blood_group"], r["units"])
+        for r in conn.execute("""
+            SELECT issue_date / 86400 AS day, requested_blood_group AS g, SUM(units) AS units, COUNT(*) AS entries
+            FROM issues WHERE recipient_id = ? GROUP BY 1, 2
+        """, (int(recipient_id),)).fetchall():
+            _bump_rollup(conn, "issue_rollup", r["day"], r["g"], -r["units"], -r["entries"])
+        conn.execute("DELETE FROM recipients WHERE id = ?", (int(recipient_id),))
+    if returned:
+        _notify_schedulers()
+
+def list_recipients():
+    return get_conn().execute(f"SELECT {_RECIPIENT_COLUMNS} FROM recipients WHERE NOT synthetic ORDER BY recipients.created_at DESC").fetchall()
+
+# Donations and Inventory
+# Every donation is a lot with remaining_units. Issues draw from lots of the issued
+# group in first-expiry-first-out order and record the draw in issue_allocations.
+# The inventory table is a ledger of live remaining units: writes apply deltas in
+# their own transaction, and expired lots are retired (remaining set to 0) by the sweep.
+# Internal helpers take blood group codes (BG_CODE) and epoch timestamps.
+def _now():
+    return _ts(datetime.now())
+
+def _adjust_inventory(conn, code, delta):
+    # A delta that would take the ledger below zero means it has drifted from the lots;
+    # fail the write rather than clamp, so verify_inventory still sees the drift.
+    _invalidate_inventory()
+    cur = conn.execute("""
+        UPDATE inventory SET available_units = available_units + ?, updated_at = ?
+        WHERE blood_group = ? AND available_units + ? >= 0
+    """, (int(delta), _now(), code, int(delta)))
+    if not cur.rowcount:
+        raise ValueError("Inventory ledger out of step with lots; run verify-inventory --repair.")
+
+def _bump_rollup(conn, table, day, code, units, entries=1):
+    conn.execute(f"""
+        INSERT INTO {table} (day, blood_group, units, entries) VALUES (?, ?, ?, ?)
+        ON CONFLICT (day, blood_group) DO UPDATE
+        SET units = units + excluded.units, entries = entries + excluded.entries
+    """, (day, code, int(units), int(entries)))
+    if entries < 0:
+        conn.execute(f"DELETE FROM {table} WHERE day = ? AND blood_group = ? AND entries <= 0", (day, code))
+
+def backfill_rollups():
+    # Rebuilds both rollup tables from the full history, archive partitions included.
+    with transaction() as conn:
+        conn.execute("DELETE FROM donation_rollup")
+        conn.execute(f"""
+            INSERT INTO donation_rollup (day, blood_group, units, entries)
+            SELECT donation_date / 86400, blood_group, SUM(units), COUNT(*) FROM {_history("donations")}
+            WHERE {DONATED_SQL} GROUP BY 1, 2
+        """)
+        conn.execute("DELETE FROM issue_rollup")
+        conn.execute(f"""
+            INSERT INTO issue_rollup (day, blood_group, units, entries)
+            SELECT issue_date / 86400, requested_blood_group, SUM(units), COUNT(*) FROM {_history("issues")} GROUP BY 1, 2
+        """)
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('rollups_built', ?)", (_now(),))
+
+def _retire_expired(conn, now):
+    # Retires every live lot past its expiry into the wastage log; returns {blood_group: units}.
+    retired = {}
+    for bg in BLOOD_GROUPS:
+        lots = conn.execute("""
+            SELECT id, remaining_units, expiry_date FROM donations
+            WHERE blood_group = ? AND remaining_units > 0 AND expiry_date < ?
+        """, (BG_CODE[bg], now)).fetchall()
+        if lots:
+            conn.executemany("UPDATE donations SET remaining_units = 0 WHERE id = ?", [(r["id"],) for r in lots])
+            conn.executemany("""
+                INSERT INTO wastage (donation_id, blood_group, units, expiry_date, retired_at) VALUES (?, ?, ?, ?, ?)
+            """, [(r["id"], BG_CODE[bg], r["remaining_units"], r["expiry_date"], now) for r in lots])
+            retired[bg] = sum(r["remaining_units"] for r in lots)
+            _adjust_inventory(conn, BG_CODE[bg], -retired[bg])
+    if retired:
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('inventory_expired_through', ?)", (now,))
+    return retired
+
+def _apply_expiries(conn):
+    now = _now()
+    _retire_expired(conn, now)
+    return now
+
+def _allocate_lots(conn, issue_id, code, units, as_of):
+    # Walks the live lots of one group in expiry order via idx_donations_lots;
+    # returns the units that could not be covered.
+    need = units
+    draws = []
+    cur = conn.execute("""
+        SELECT id, remaining_units FROM donations
+        WHERE blood_group = ? AND remaining_units > 0 AND expiry_date >= ? AND donation_date <= ?
+        ORDER BY expiry_date, id
+    """, (code, as_of, as_of))
+    while need:
+        lots = cur.fetchmany(16)
+        if not lots:
+            break
+        for lot in lots:
+            take = min(need, lot["remaining_units"])
+            draws.append((take, lot["id"]))
+            need -= take
+            if not need:
+                break
+    cur.close()
+    conn.executemany("UPDATE donations SET remaining_units = remaining_units - ? WHERE id = ?", draws)
+    conn.executemany("INSERT INTO issue_allocations (issue_id, donation_id, units) VALUES (?, ?, ?)",
+                     [(issue_id, lot_id, take) for take, lot_id in draws])
+    return need
+
+def _replay_allocations(conn):
+    # One-off for databases created before lot tracking: every lot starts full and
+    # past issues are drawn from the lots that were live when they were issued.
+    conn.execute("UPDATE donations SET remaining_units = units")
+    for r in conn.execute("SELECT id, blood_group_issued, units, issue_date FROM issues ORDER BY issue_date, id").fetchall():
+        _allocate_lots(conn, r["id"], r["blood_group_issued"], r["units"], r["issue_date"])
+    conn.execute("UPDATE donations SET remaining_units = 0 WHERE expiry_date < ?", (_now(),))
+
+def refresh_inventory():
+    with transaction() as conn:
+        _apply_expiries(conn)
+
+@retry_on_busy
+def record_donation(donor_id, blood_group, units, donation_date=None):
+    bg = normalize_blood_group(blood_group)
+    units = int(units)
+    if units <= 0: raise ValueError("Units must be positive")
+    donor_id = int(donor_id)
+    when = datetime.now() if not donation_date else datetime.strptime(donation_date, "%Y-%m-%d")
+    if when > datetime.now():
+        # Lots are only drawn once donated, so a future lot would sit in stock unissuable.
+        raise ValueError("donation_date cannot be in the future")
+    expiry = _ts(when) + DONATION_EXPIRY_DAYS * 86400
+    donation_code = new_donation_code()
+    with transaction() as conn:
+        d = conn.execute("SELECT id FROM donors WHERE id = ? AND NOT synthetic", (donor_id,)).fetchone()
+        if not d:
+            raise ValueError("Donor not found")
+        # Back-dated donations that are already expired never enter stock.
+        live = expiry >= _apply_expiries(conn)
+        conn.execute("""
+            INSERT INTO donations (donor_id, donation_code, blood_group, units, donation_date, expiry_date, remaining_units)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (donor_id, donation_code, BG_CODE[bg], units, _ts(when), expiry, units if live else 0))
+        conn.execute("UPDATE donors SET last_donation_date = ? WHERE id = ?", (_day(when), donor_id))
+        _bump_rollup(conn, "donation_rollup", _day(when), BG_CODE[bg], units)
+        if live:
+            _adjust_inventory(conn, BG_CODE[bg], units)
+    if live:
+        _notify_schedulers(expiry)
+    return donation_code
+
+def verify_inventory(repair=False):
+    # Recomputes stock from the live lots; returns [(blood_group, recorded, expected)] for every drifted group.
+    drift = []
+    with transaction() as conn:
+        now = _now()
+        try:
+            with transaction():
+                _retire_expired(conn, now)
+            swept = True
+        except ValueError:
+            # The sweep itself hit the drift; expected below only counts unexpired lots anyway.
+            swept = False
+        for bg in BLOOD_GROUPS:
+            expected = conn.execute("""
+                SELECT COALESCE(SUM(remaining_units),0) AS total
+                FROM donations
+                WHERE blood_group = ? AND remaining_units > 0 AND expiry_date >= ?
+            """, (BG_CODE[bg], now)).fetchone()["total"]
+            recorded = conn.execute("SELECT available_units FROM inventory WHERE blood_group = ?",
+                                    (BG_CODE[bg],)).fetchone()["available_units"]
+            if recorded != expected:
+                drift.append((bg, recorded, expected))
+            if repair:
+                _invalidate_inventory()
+                conn.execute("UPDATE inventory SET available_units = ?, updated_at = ? WHERE blood_group = ?",
+                             (expected, now, BG_CODE[bg]))
+        if repair and not swept:
+            # Expired lots still hold units the repaired ledger no longer counts: retire them
+            # against a ledger that includes them, which brings it back to expected.
+            conn.execute("""
+                UPDATE inventory SET available_units = available_units + (
+                    SELECT COALESCE(SUM(remaining_units),0) FROM donations
+                    WHERE blood_group = inventory.blood_group AND remaining_units > 0 AND expiry_date < ?)
+            """, (now,))
+            _retire_expired(conn, now)
+        if repair:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('inventory_expired_through', ?)", (now,))
+    return drift
+
+def recalc_inventory():
+    # Used after bulk writes to lots, so the expiry schedulers reload as well.
+    drift = verify_inventory(repair=True)
+    _notify_schedulers()
+    return drift
+
+# Inventory snapshot cache
+# Reads between writes are served from memory. Each thread caches against its own
+# connection: the snapshot is dropped with the connection, by ledger changes, by any
+# write on that connection (total_changes), by commits from other connections
+# (PRAGMA data_version) and when the next live lot expires. It is never filled inside an open transaction.
+# A miss runs the expiry sweep only when some live lot is already past its expiry.
+_inventory_lock = threading.Lock()
+_inventory_stats = {"hits": 0, "misses": 0}
+
+def _invalidate_inventory():
+    _local.inventory = None
+
+def _inventory_snapshot():
+    conn = get_conn()
+    key = (DB_FILE, conn.execute("PRAGMA data_version").fetchone()[0], conn.total_changes)
+    cache = getattr(_local, "inventory", None)
+    hit = cache is not None and cache["key"] == key and (cache["valid_until"] is None or _now() < cache["valid_until"])
+    with _inventory_lock:
+        _inventory_stats["hits" if hit else "misses"] += 1
+    if hit:
+        return cache
+    first_expiry = _first_expiries(conn)
+    if first_expiry is not None and first_expiry < _now():
+        refresh_inventory()
+        first_expiry = _first_expiries(conn)
+    cache = {
+        "key": (DB_FILE, conn.execute("PRAGMA data_version").fetchone()[0], conn.total_changes),
+        # ORDER BY resolves to the decoded alias, so rows keep the v1 alphabetical order.
+        "list": conn.execute(f"""
+            SELECT {_bg_sql("blood_group")} AS blood_group, available_units, {_ts_sql("updated_at")} AS updated_at
+            FROM inventory ORDER BY blood_group
+        """).fetchall(),
+        "full": conn.execute(f"SELECT {_INVENTORY_COLUMNS} FROM inventory ORDER BY blood_group").fetchall(),
+        "valid_until": first_expiry,
+    }
+    if not _local.depth:
+        _local.inventory = cache
+    return cache
+
+def inventory_cache_stats(reset=False):
+    with _inventory_lock:
+        stats = dict(_inventory_stats)
+        if reset:
+            _inventory_stats.update(hits=0, misses=0)
+    return stats
+
+def _first_expiries(conn):
+    # Earliest expiry among live lots, one idx_donations_lots probe per group.
+    return min((r["first_expiry"] for r in (conn.execute("""
+        SELECT MIN(expiry_date) AS first_expiry FROM donations WHERE blood_group = ? AND remaining_units > 0
+    """, (code,)).fetchone() for code in BG_CODE.values()) if r["first_expiry"]), default=None)
+
+def list_inventory():
+    return list(_inventory_snapshot()["list"])
+
+def low_stock_alerts(threshold=5):
+    rows = list_inventory()
+    low = []
+    out = []
+    for r in rows:
+        if r["available_units"] == 0:
+            out.append(r)
+        elif r["available_units"] < threshold:
+            low.append(r)
+    return low, out
+
+def expiring_soon(days=7, blood_group=None):
+    # Live units per group whose lots expire within the next `days` days.
+    now = _now()
+    until = now + int(days) * 86400
+    groups = [normalize_blood_group(blood_group)] if blood_group else BLOOD_GROUPS
+    conn = get_conn()
+    return [conn.execute(f"""
+        SELECT ? AS blood_group, COALESCE(SUM(remaining_units),0) AS units, COUNT(*) AS lots,
+               {_ts_sql("MIN(expiry_date)")} AS first_expiry
+        FROM donations
+        WHERE blood_group = ? AND remaining_units > 0 AND expiry_date >= ? AND expiry_date < ?
+    """, (bg, BG_CODE[bg], now, until)).fetchone() for bg in groups]
+
+def wastage_report(start=None, end=None):
+    # Units retired at expiry per blood group; start/end bound the expiry day.
+    where, params = _date_range("expiry_date", start, end)
+    return get_conn().execute(f"""
+        SELECT {_bg_sql("wastage.blood_group")} AS blood_group, COALESCE(SUM(units),0) AS units, COUNT(*) AS lots
+        FROM wastage{where}
+        GROUP BY wastage.blood_group
+        ORDER BY blood_group
+    """, params).fetchall()
+
+# Demand forecast
+# One forecast.Forecaster per database, advanced from issue_rollup a complete day at a
+# time, so a refresh reads only the days since the last one. Today's issues so far come
+# straight from the rollup and are taken off today's expected demand, so every issue
+# moves days of supply immediately. Demand is forecast by requested group, stock by lot.
+_forecast_lock = threading.Lock()
+_forecasts = {}
+
+def refresh_forecast(rebuild=False):
+    today = _today()
+    conn = get_conn()
+    with _forecast_lock:
+        model = _forecasts.get(DB_FILE)
+        if model is None or rebuild:
+            model = _forecasts[DB_FILE] = forecast.Forecaster(BLOOD_GROUPS)
+        since = -1 if model.last_day is None else model.last_day
+        daily = {(r[0], BLOOD_GROUPS[r[1]]): r[2] for r in conn.execute("""
+            SELECT day, blood_group, units FROM issue_rollup WHERE day > ? AND day < ?
+        """, (since, today))}
+        model.advance(daily, today - 1)
+    return model
+
+def days_of_supply(horizon=forecast.HORIZON_DAYS):
+    # Per group: live units, forecast demand for the next 7 days, projected days of
+    # supply (None when stock outlasts the horizon) and units set to expire unused.
+    model = refresh_forecast()
+    now, today = _now(), _today()
+    conn = get_conn()
+    issued_today = {r[0]: r[1] for r in conn.execute("SELECT blood_group, units FROM issue_rollup WHERE day = ?", (today,))}
+    out = []
+    for bg in BLOOD_GROUPS:
+        code = BG_CODE[bg]
+        lots = [(r[0], (r[1] - now) / 86400) for r in conn.execute("""
+            SELECT remaining_units, expiry_date FROM donations
+            WHERE blood_group = ? AND remaining_units > 0 AND expiry_date >= ?
+        """, (code, now))]
+
+        def demand(k, bg=bg, code=code):
+            if k == 0:
+                return max(model.demand(bg, today) - issued_today.get(code, 0), 0.0)
+            return model.demand(bg, today + k)
+
+        days, expiring = forecast.days_of_supply(lots, demand, horizon)
+        out.append({
+            "blood_group": bg,
+            "available_units": sum(units for units, _ in lots),
+            "weekly_demand": round(sum(model.demand(bg, today + k) for k in range(7)), 1),
+            "days_of_supply": None if days is None else round(days, 1),
+            "expiring_units": round(expiring),
+        })
+    return out
+
+def supply_alerts(warning_days=forecast.WARNING_DAYS, critical_days=forecast.CRITICAL_DAYS):
+    # (low, critical): groups projected to run out within warning_days and within
+    # critical_days; a group with no units at all is always critical.
+    low, critical = [], []
+    for r in days_of_supply():
+        if r["available_units"] == 0 or (r["days_of_supply"] is not None and r["days_of_supply"] < critical_days):
+            critical.append(r)
+        elif r["days_of_supply"] is not None and r["days_of_supply"] < warning_days:
+            low.append(r)
+    return low, critical
+
+# Expiry scheduler
+# A background thread keeps the EXPIRY_HEAP_SIZE earliest live lot expiries across all
+# groups in a min-heap (merged from per-group idx_donations_lots reads) and sleeps until
+# the earliest one. At that moment it retires the expired lots, and for each affected
+# group that is now under LOW_STOCK_THRESHOLD it calls the registered low-stock
+# listeners with (blood_group, available_units). Every lot left out of the heap expires
+# no earlier than its last entry, so the heap is reloaded once it drains. Writes in this
+# process that add live lots call _notify_schedulers(); lots written by other processes
+# are picked up by the reload every EXPIRY_IDLE_RELOAD_S, and until then by the sweep
+# that inventory reads run when a live lot is past its expiry.
+LOW_STOCK_THRESHOLD = 5
+EXPIRY_HEAP_SIZE = 64
+EXPIRY_IDLE_RELOAD_S = 300
+
+_low_stock_listeners = []
+_active_schedulers = set()
+
+def _notify_schedulers(expiry=None):
+    for scheduler in list(_active_schedulers):
+        if scheduler.db_file == DB_FILE:
+            scheduler.notify(expiry)
+
+def add_low_stock_listener(callback):
+    _low_stock_listeners.append(callback)
+
+def remove_low_stock_listener(callback):
+    if callback in _low_stock_listeners:
+        _low_stock_listeners.remove(callback)
+
+class ExpiryScheduler:
+    def __init__(self, threshold=LOW_STOCK_THRESHOLD):
+        self.db_file = DB_FILE
+        self.threshold = threshold
+        self.heap = []
+        self.cutoff = None  # expiry of the last heap entry when more live lots follow it
+        self._reload = True
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="expiry-scheduler", daemon=True)
+            _active_schedulers.add(self)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        _active_schedulers.discard(self)
+
+    def notify(self, expiry=None):
+        # Ask for a heap reload after live lots were added, e.g. by a back-dated import.
+        # A single lot expiring after the heap's cutoff is loaded when the heap drains.
+        if expiry is not None and self.cutoff is not None and expiry >= self.cutoff:
+            return
+        self._reload = True
+        self._wake.set()
+
+    def _load(self):
+        conn = get_conn()
+        self._reload = False
+        streams = [conn.execute("""
+            SELECT expiry_date, id FROM donations
+            WHERE blood_group = ? AND remaining_units > 0
+            ORDER BY expiry_date, id LIMIT ?
+        """, (code, EXPIRY_HEAP_SIZE + 1)).fetchall() for code in BG_CODE.values()]
+        lots = list(heapq.merge(*[[tuple(r) for r in rows] for rows in streams]))
+        self.heap = lots[:EXPIRY_HEAP_SIZE]
+        self.cutoff = self.heap[-1][0] if len(lots) > EXPIRY_HEAP_SIZE else None
+
+    def _seconds_until(self, when):
+        return max(0.0, when - (datetime.now() - _EPOCH).total_seconds())
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                if self._reload or not self.heap:
+                    self._load()
+                # Expiry times have one-second resolution; wake just after the second has passed.
+                timeout = self._seconds_until(self.heap[0][0]) + 1 if self.heap else EXPIRY_IDLE_RELOAD_S
+                if self._wake.wait(min(timeout, EXPIRY_IDLE_RELOAD_S)):
+                    self._wake.clear()
+                    continue
+                if self.heap and self.heap[0][0] < _now():
+                    try:
+                        self.retire_due()
+                    except ValueError as e:
+                        # Ledger drift: report it and retry after the idle wait, once repaired.
+                        print(f"expiry scheduler: {e}", file=sys.stderr)
+                        self._wake.wait(EXPIRY_IDLE_RELOAD_S)
+                        self._reload = True
+                else:
+                    self._reload = True
+        finally:
+            close_conn()
+
+    def retire_due(self):
+        now = _now()
+        first_due = self.heap[0][0] if self.heap else now
+        while self.heap and self.heap[0][0] < now:
+            heapq.heappop(self.heap)
+        with transaction() as conn:
+            retired = _retire_expired(conn, now)
+            # Lots that an inventory read retired first still raise their group's alert.
+            groups = set(retired) | {BLOOD_GROUPS[r[0]] for r in conn.execute("""
+                SELECT DISTINCT blood_group FROM wastage WHERE expiry_date >= ? AND expiry_date < ?
+            """, (first_due, now))}
+            levels = {bg: conn.execute("SELECT available_units FROM inventory WHERE blood_group = ?",
+                                       (BG_CODE[bg],)).fetchone()[0]
+                      for bg in groups}
+        for bg, available in levels.items():
+            if available < self.threshold:
+                for callback in list(_low_stock_listeners):
+                    callback(bg, available)
+        return retired
+
+def _take_stock(conn, code, units):
+    # Atomic check-and-decrement; False when the group cannot cover the request.
+    _invalidate_inventory()
+    cur = conn.execute("""
+        UPDATE inventory SET available_units = available_units - ?, updated_at = ?
+        WHERE blood_group = ? AND available_units >= ?
+    """, (units, _now(), code, units))
+    return cur.rowcount == 1
+
+@retry_on_busy
+def record_issue(recipient_id, requested_blood_group, units):
+    # Runs as one BEGIN IMMEDIATE transaction, so concurrent issuers serialize on the
+    # write lock and each sees the stock left by the previous one.
+    recipient_id = int(recipient_id)
+    units = int(units)
+    if units <= 0: raise ValueError("Units must be positive")
+    requested = normalize_blood_group(requested_blood_group)
+    with transaction() as conn:
+        rec = conn.execute("SELECT id FROM recipients WHERE id = ? AND NOT synthetic", (recipient_id,)).fetchone()
+        if not rec:
+            raise ValueError("Recipient not found")
+        now = _apply_expiries(conn)
+        candidates = [requested] + [g for g in COMPATIBILITY[requested] if g != requested]
+        issued_group = next((g for g in candidates if _take_stock(conn, BG_CODE[g], units)), None)
+        if not issued_group:
+            raise ValueError("Insufficient compatible stock.")
+        _insert_issue(conn, recipient_id, requested, issued_group, units, now)
+    return issued_group
+
+def _insert_issue(conn, recipient_id, requested, issued_group, units, now):
+    # Stock for issued_group must already have been taken with _take_stock.
+    compatible_flag = COMPAT_MASK[requested] >> BG_CODE[issued_group] & 1
+    cur = conn.execute("""
+        INSERT INTO issues (recipient_id, requested_blood_group, blood_group_issued, units, issue_date, compatible, status)
+        VALUES (?, ?, ?, ?, ?, ?, 'issued')
+    """, (recipient_id, BG_CODE[requested], BG_CODE[issued_group], units, now, compatible_flag))
+    if _allocate_lots(conn, cur.lastrowid, BG_CODE[issued_group], units, now):
+        raise ValueError("Inventory ledger out of step with lots; run verify-inventory --repair.")
+    _bump_rollup(conn, "issue_rollup", now // 86400, BG_CODE[requested], units)
+
+def list_issues():
+    return get_conn().execute(f"SELECT {_ISSUE_COLUMNS} FROM issues ORDER BY issues.issue_date DESC").fetchall()
+
+# Batch allocation
+# All pending recipients are solved together as a min-cost max-flow over the
+# COMPATIBILITY matrix: stock -> donor group -> recipient group -> demand. Max flow
+# fulfils as many units as possible; the cost of giving group g to another group is
+# the number of groups g can serve, so universal O- is used last. Each recipient
+# group's share is then handed out first come, first served.
+def _donor_reach():
+    return {g: sum(g in allowed for allowed in COMPATIBILITY.values()) for g in BLOOD_GROUPS}
+
+def _min_cost_flow(node_count, edges, source, sink):
+    # edges: [(u, v, capacity, cost)]; returns flow per input edge. Uses successive
+    # shortest paths (Bellman-Ford), which is plenty for an 18-node graph.
+    graph = [[] for _ in range(node_count)]
+    arcs = []
+    for u, v, cap, cost in edges:
+        graph[u].append(len(arcs)); arcs.append([v, cap, cost])
+        graph[v].append(len(arcs)); arcs.append([u, 0, -cost])
+    while True:
+        dist = [None] * node_count
+        via = [None] * node_count
+        dist[source] = 0
+        changed = True
+        while changed:
+            changed = False
+            for u in range(node_count):
+                if dist[u] is None:
+                    continue
+                for a in graph[u]:
+                    v, cap, cost = arcs[a]
+                    if cap > 0 and (dist[v] is None or dist[u] + cost < dist[v]):
+                        dist[v] = dist[u] + cost
+                        via[v] = a
+                        changed = True
+        if dist[sink] is None:
+            break
+        push, v = None, sink
+        while v != source:
+            a = via[v]
+            push = arcs[a][1] if push is None else min(push, arcs[a][1])
+            v = arcs[a ^ 1][0]
+        v = sink
+        while v != source:
+            a = via[v]
+            arcs[a][1] -= push
+            arcs[a ^ 1][1] += push
+            v = arcs[a ^ 1][0]
+    return [arcs[2 * i + 1][1] for i in range(len(edges))]
+
+def pending_recipients():
+    return get_conn().execute(f"""
+        SELECT r.id, {_bg_sql("r.required_blood_group")} AS required_blood_group,
+               r.quantity_needed - COALESCE(SUM(i.units),0) - COALESCE(c.units,0) AS pending
+        FROM recipients r
+        LEFT JOIN issues i ON i.recipient_id = r.id
+        LEFT JOIN issue_carry c ON c.recipient_id = r.id
+        WHERE NOT r.synthetic
+        GROUP BY r.id
+        HAVING pending > 0
+        ORDER BY r.created_at, r.id
+    """).fetchall()
+
+@retry_on_busy
+def allocate_pending(dry_run=False):
+    with transaction() as conn:
+        now = _apply_expiries(conn)
+        stock = {BLOOD_GROUPS[r["blood_group"]]: r["available_units"]
+                 for r in conn.execute("SELECT blood_group, available_units FROM inventory")}
+        pending = pending_recipients()
+        demand = {g: 0 for g in BLOOD_GROUPS}
+        for r in pending:
+            demand[r["required_blood_group"]] += r["pending"]
+        source, sink, n = 0, 1, len(BLOOD_GROUPS)
+        supply_node = {g: 2 + i for i, g in enumerate(BLOOD_GROUPS)}
+        demand_node = {g: 2 + n + i for i, g in enumerate(BLOOD_GROUPS)}
+        reach = _donor_reach()
+        edges = [(source, supply_node[g], stock.get(g, 0), 0) for g in BLOOD_GROUPS]
+        edges += [(demand_node[g], sink, demand[g], 0) for g in BLOOD_GROUPS]
+        pairs = [(d, r) for r in BLOOD_GROUPS for d in COMPATIBILITY[r]]
+        edges += [(supply_node[d], demand_node[r], demand[r], 0 if d == r else reach[d]) for d, r in pairs]
+        flows = _min_cost_flow(2 + 2 * n, edges, source, sink)[2 * n:]
+        # Per recipient group, the donor groups to draw from, cheapest first.
+        share = {g: [] for g in BLOOD_GROUPS}
+        for (d, r), units in zip(pairs, flows):
+            if units:
+                share[r].append([0 if d == r else reach[d], d, units])
+        for g in share:
+            share[g].sort()
+        issued, unmet = [], []
+        for r in pending:
+            need = r["pending"]
+            for entry in share[r["required_blood_group"]]:
+                take = min(need, entry[2])
+                if take:
+                    issued.append((r["id"], r["required_blood_group"], entry[1], take))
+                    entry[2] -= take
+                    need -= take
+            if need:
+                unmet.append((r["id"], r["required_blood_group"], need))
+        if not dry_run:
+            for recipient_id, requested, issued_group, units in issued:
+                if not _take_stock(conn, BG_CODE[issued_group], units):
+                    raise ValueError("Inventory ledger out of step with lots; run verify-inventory --repair.")
+                _insert_issue(conn, recipient_id, requested, issued_group, units, now)
+    return {"issued": issued, "unmet": unmet,
+            "units_issued": sum(x[3] for x in issued), "units_unmet": sum(x[2] for x in unmet)}
+
+# Search & Reports
+def search_donors(term=None, blood_group=None, location=None):
+    term = (term or "").strip()
+    location = (location or "").strip()
+    params = []
+    match = []
+    query = f"SELECT {_DONOR_COLUMNS} FROM donors WHERE NOT donors.synthetic"
+    if term:
+        if _fts_enabled and len(term) >= FTS_MIN_TERM:
+            match.append("{name phone} : " + _fts_phrase(term))
+        else:
+            query += " AND (donors.name LIKE ? OR donors.phone LIKE ?)"
+            params += [f"%{term}%", f"%{term}%"]
+    if blood_group:
+        bg = normalize_blood_group(blood_group)
+        query += " AND donors.blood_group = ?"
+        params.append(BG_CODE[bg])
+    if location:
+        if _fts_enabled and len(location) >= FTS_MIN_TERM:
+            match.append("address : " + _fts_phrase(location))
+        else:
+            query += " AND donors.address LIKE ?"
+            params.append(f"%{location}%")
+    if match:
+        query = query.replace("FROM donors WHERE", "FROM donors_fts JOIN donors ON donors.id = donors_fts.rowid WHERE donors_fts MATCH ? AND")
+        query += " ORDER BY donors_fts.rank, donors.name"
+        params.insert(0, " AND ".join(match))
+    else:
+        query += " ORDER BY donors.name"
+    return get_conn().execute(query, params).fetchall()
+
+def search_inventory(blood_group=None):
+    rows = _inventory_snapshot()["full"]
+    if blood_group:
+        bg = normalize_blood_group(blood_group)
+        return [r for r in rows if r["blood_group"] == bg]
+    return list(rows)
+
+def report_totals():
+    units_total = sum(r["available_units"] for r in _inventory_snapshot()["list"])
+    donors_total = get_conn().execute("SELECT COUNT(*) AS c FROM donors WHERE NOT synthetic").fetchone()["c"]
+    return donors_total, units_total
+
+# Reports read only the rollup tables, so their cost follows the number of days, not rows.
+def report_most_requested_group():
+    row = get_conn().execute(f"""
+        SELECT {_bg_sql("blood_group")} AS g, SUM(entries) AS cnt
+        FROM issue_rollup
+        GROUP BY blood_group
+        ORDER BY cnt DESC
+        LIMIT 1
+    """).fetchone()
+    if row:
+        return row["g"], row["cnt"]
+    return None, 0
+
+def report_most_donated_group():
+    row = get_conn().execute(f"""
+        SELECT {_bg_sql("blood_group")} AS g, COALESCE(SUM(units),0) AS cnt
+        FROM donation_rollup
+        GROUP BY blood_group
+        ORDER BY cnt DESC
+        LIMIT 1
+    """).fetchone()
+    if row:
+        return row["g"], row["cnt"]
+    return None, 0
+
+def report_daily_donations():
+    return get_conn().execute(f"""
+        SELECT {_day_sql("donation_rollup.day")} AS day, COALESCE(SUM(units),0) AS units
+        FROM donation_rollup
+        GROUP BY donation_rollup.day
+        ORDER BY donation_rollup.day DESC
+    """).fetchall()
+
+def report_monthly_donations():
+    return get_conn().execute("""
+        SELECT strftime('%Y-%m', day * 86400, 'unixepoch') AS month, COALESCE(SUM(units),0) AS units
+        FROM donation_rollup
+        GROUP BY month
+        ORDER BY month DESC
+    """).fetchall()
+
+def match_compatible_donors(required_group):
+    mask = COMPAT_MASK[normalize_blood_group(required_group)]
+    return get_conn().execute(f"""
+        SELECT {_DONOR_COLUMNS} FROM donors WHERE (? >> donors.blood_group) & 1 AND NOT donors.synthetic ORDER BY donors.name
+    """, (mask,)).fetchall()
+
+# Bulk import
+# Rows stream from CSV or JSONL, are validated like the single-row API, and are
+# written with executemany in chunks of IMPORT_CHUNK_SIZE, one commit per chunk.
+IMPORT_CHUNK_SIZE = 5000
+MAX_REJECTS_REPORTED = 1000
+
+def _read_rows(path):
+    if str(path).lower().endswith((".jsonl", ".ndjson")):
+        with open(path, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                if line.strip():
+                    yield line_no, json.loads(line)
+    else:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+
+def _chunks(rows, validate, chunk_size, report):
+    chunk = []
+    for line_no, raw in rows:
+        report["rows"] += 1
+        try:
+            chunk.append((line_no, validate({k: (v.strip() if isinstance(v, str) else v) for k, v in raw.items() if k})))
+        except (ValueError, TypeError, KeyError) as e:
+            _reject(report, line_no, e)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _reject(report, line_no, reason):
+    report["rejected"] += 1
+    if len(report["rejects"]) < MAX_REJECTS_REPORTED:
+        report["rejects"].append((line_no, str(reason)))
+
+def _new_report():
+    return {"rows": 0, "inserted": 0, "updated": 0, "duplicates": 0, "rejected": 0, "rejects": [],
+            "seconds": 0.0, "rows_per_sec": 0.0, "_start": time.perf_counter()}
+
+def _finish_report(report):
+    report["seconds"] = time.perf_counter() - report.pop("_start")
+    report["rows_per_sec"] = report["rows"] / report["seconds"] if report["seconds"] else 0.0
+    return report
+
+def _positive_int(value, field):
+    value = int(value)
+    if value <= 0:
+        raise ValueError(f"{field} must be positive")
+    return value
+
+def _validate_donor(r):
+    name = (r.get("name") or "").strip()
+    if not name:
+        raise ValueError("name is required")
+    gender = (r.get("gender") or "").title() or None
+    if gender not in (None, "Male", "Female", "Other"):
+        raise ValueError("gender must be Male, Female or Other")
+    last = r.get("last_donation_date") or None
+    if last:
+        check_date(last, "last_donation_date")
+    return (name, _positive_int(r.get("age"), "age"), gender, r.get("phone"),
+            r.get("address"), BG_CODE[normalize_blood_group(r.get("blood_group"))], _parse_day(last) if last else None)
+
+def _validate_recipient(r):
+    name = (r.get("name") or "").strip()
+    if not name:
+        raise ValueError("name is required")
+    return (name, _positive_int(r.get("age"), "age"), BG_CODE[normalize_blood_group(r.get("required_blood_group"))],
+            _positive_int(r.get("quantity_needed"), "quantity_needed"), r.get("hospital_name") or None)
+
+def _validate_donation(r):
+    donation_date = r.get("donation_date") or None
+    if donation_date:
+        check_date(donation_date, "donation_date")
+        day = datetime.strptime(donation_date, "%Y-%m-%d")
+        if day > datetime.now():
+            raise ValueError("donation_date cannot be in the future")
+    else:
+        day = datetime.now()
+    return (int(r.get("donor_id")), BG_CODE[normalize_blood_group(r.get("blood_group"))],
+            _positive_int(r.get("units"), "units"), day, r.get("donation_code") or None)
+
+def bulk_import_donors(path, chunk_size=IMPORT_CHUNK_SIZE):
+    # Donors with the same name and phone as an existing donor are updated in place;
+    # repeats collapse onto the last row. last_donation_date keeps the latest date given,
+    # within a chunk as across chunks, so the result does not depend on chunk_size.
+    report = _new_report()
+    for chunk in _chunks(_read_rows(path), _validate_donor, chunk_size, report):
+        _upsert_donors(chunk, report)
+    return _finish_report(report)
+
+def _upsert_donors(chunk, report):
+    latest = {}
+    for line_no, row in chunk:
+        key = (row[0], row[3])
+        if key in latest:
+            dates = [d for d in (latest[key][6], row[6]) if d is not None]
+            row = row[:6] + (max(dates) if dates else None,)
+        latest[key] = row
+    report["duplicates"] += len(chunk) - len(latest)
+    with transaction() as conn:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS import_keys (name TEXT, phone TEXT)")
+        conn.execute("DELETE FROM import_keys")
+        conn.executemany("INSERT INTO import_keys (name, phone) VALUES (?, ?)", list(latest))
+        existing = {(r["name"], r["phone"]): r["id"] for r in conn.execute("""
+            SELECT d.id, d.name, d.phone FROM import_keys k
+            JOIN donors d ON d.name = k.name AND d.phone IS k.phone AND NOT d.synthetic
+        """)}
+        updates = [row[1:3] + row[4:6] + (row[6], row[6], existing[key])
+                   for key, row in latest.items() if key in existing]
+        inserts = [row for key, row in latest.items() if key not in existing]
+        conn.executemany("""
+            UPDATE donors SET age = ?, gender = ?, address = ?, blood_group = ?,
+                last_donation_date = COALESCE(MAX(last_donation_date, ?), last_donation_date, ?)
+            WHERE id = ?
+        """, updates)
+        conn.executemany("""
+            INSERT INTO donors (name, age, gender, phone, address, blood_group, last_donation_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, inserts)
+    report["inserted"] += len(inserts)
+    report["updated"] += len(updates)
+
+def bulk_import_recipients(path, chunk_size=IMPORT_CHUNK_SIZE):
+    report = _new_report()
+    for chunk in _chunks(_read_rows(path), _validate_recipient, chunk_size, report):
+        with transaction() as conn:
+            conn.executemany("""
+                INSERT INTO recipients (name, age, required_blood_group, quantity_needed, hospital_name)
+                VALUES (?, ?, ?, ?, ?)
+            """, [row for _, row in chunk])
+        report["inserted"] += len(chunk)
+    return _finish_report(report)
+
+def bulk_import_donations(path, chunk_size=IMPORT_CHUNK_SIZE):
+    # Inventory and rollups are rebuilt once at the end rather than adjusted per row.
+    report = _new_report()
+    now = _now()
+    for chunk in _chunks(_read_rows(path), _validate_donation, chunk_size, report):
+        with transaction() as conn:
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS import_ids (id INTEGER PRIMARY KEY)")
+            conn.execute("DELETE FROM import_ids")
+            conn.executemany("INSERT OR IGNORE INTO import_ids (id) VALUES (?)", [(row[0],) for _, row in chunk])
+            known = {r["id"] for r in conn.execute("SELECT d.id FROM import_ids i JOIN donors d ON d.id = i.id AND NOT d.synthetic")}
+            rows, last = [], {}
+            for line_no, (donor_id, bg, units, day, code) in chunk:
+                if donor_id not in known:
+                    _reject(report, line_no, "Donor not found")
+                    continue
+                code = code or new_donation_code()
+                expiry = _ts(day) + DONATION_EXPIRY_DAYS * 86400
+                rows.append((donor_id, code, bg, units, _ts(day), expiry, units if expiry >= now else 0))
+                last[donor_id] = max(last.get(donor_id, 0), _day(day))
+            before = conn.total_changes
+            conn.executemany("""
+                INSERT OR IGNORE INTO donations (donor_id, donation_code, blood_group, units, donation_date, expiry_date, remaining_units)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            inserted = conn.total_changes - before
+            conn.executemany("""
+                UPDATE donors SET last_donation_date = COALESCE(MAX(last_donation_date, ?), ?) WHERE id = ?
+            """, [(d, d, donor_id) for donor_id, d in last.items()])
+        report["inserted"] += inserted
+        report["duplicates"] += len(rows) - inserted
+    recalc_inventory()
+    backfill_rollups()
+    return _finish_report(report)
+
+# Phase 1 migration
+# Moves a phase1_cli_json.py data directory into this database. The JSON arrays are
+# decoded one element at a time with JSONDecoder.raw_decode over fixed-size reads, so
+# memory stays bounded whatever the file size. Donors are upserted like bulk imports.
+# Phase 1 stock has no donor provenance: each group's quantity becomes one live lot
+# dated today from a "Phase 1 inventory <group>" donor flagged synthetic, which donor
+# lists, eligibility, matching, exports and the donation reports leave out. Phase 1
+# requests have no recipient: they become issues of a "Phase 1 requests <group>"
+# recipient, flagged synthetic and left out of the recipient lists, and draw from no
+# lot, since the Phase 1 quantities are already net of them.
+PHASE1_READ_SIZE = 1 << 16
+PHASE1_PARTIAL_TOKEN = 5  # longest literal or escape a read boundary can cut ("false", "\\uXXX")
+PHASE1_DONOR = "Phase 1 inventory"
+PHASE1_RECIPIENT = "Phase 1 requests"
+
+def _iter_json_array(path, read_size=PHASE1_READ_SIZE):
+    # Yields (index, element) for each element of the top-level array in path. A decode
+    # error is only taken for a read boundary when it is within a few characters of the
+    # end of the buffer, or inside a string still open there; anything else is malformed
+    # and raises ValueError with its character offset in the file.
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf, pos, started, index, consumed = "", 0, False, 0, 0
+        while True:
+            chunk = f.read(read_size)
+            eof = not chunk
+            consumed += pos
+            buf, pos = buf[pos:] + chunk, 0
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n,":
+                    pos += 1
+                if pos == len(buf):
+                    break
+                if not started:
+                    if buf[pos] != "[":
+                        raise ValueError(f"{path}: expected a JSON array")
+                    started, pos = True, pos + 1
+                    continue
+                if buf[pos] == "]":
+                    return
+                try:
+                    value, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError as e:
+                    if eof or (len(buf) - e.pos > PHASE1_PARTIAL_TOKEN and not e.msg.startswith("Unterminated string")):
+                        raise ValueError(f"{path}: malformed JSON at character {consumed + e.pos}: {e.msg}") from None
+                    break  # the element continues past this read
+                if not eof and (end == len(buf) or buf[end] in "0123456789.eE+-"):
+                    break  # a bare number may continue too
+                index += 1
+                yield index, value
+                pos = end
+            if eof:
+                raise ValueError(f"{path}: unterminated JSON array")
+
+def _validate_phase1_stock(r):
+    quantity = int(r.get("quantity") or 0)
+    if quantity < 0:
+        raise ValueError("quantity must not be negative")
+    return BG_CODE[normalize_blood_group(r.get("blood_group"))], quantity
+
+def _validate_phase1_request(r):
+    issued = r.get("issue_date")
+    when = datetime.strptime(issued, "%Y-%m-%d %H:%M:%S") if issued else datetime.now()
+    return BG_CODE[normalize_blood_group(r.get("blood_group"))], _positive_int(r.get("quantity"), "quantity"), _ts(when)
+
+def _synthetic(conn, table, name, code, create):
+    row = conn.execute(f"SELECT id FROM {table} WHERE name = ?", (f"{name} {BLOOD_GROUPS[code]}",)).fetchone()
+    return row["id"] if row else create(f"{name} {BLOOD_GROUPS[code]}")
+
+def migrate_phase1(directory=".", chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+    # Returns {"donors", "inventory", "requests": import reports, "reconcile": rows of
+    # (blood_group, phase 1 stock, migrated live units, phase 1 issued, migrated issued)}.
+    paths = {kind: os.path.join(directory, f"{kind}.json") for kind in ("donors", "inventory", "requests")}
+    conn = get_conn()
+    if conn.execute("SELECT 1 FROM donors WHERE name LIKE ? UNION ALL SELECT 1 FROM recipients WHERE name LIKE ?",
+                    (PHASE1_DONOR + " %", PHASE1_RECIPIENT + " %")).fetchone():
+        raise ValueError("Phase 1 data has already been migrated into this database")
+    result = {}
+    expected_stock, expected_issued = [0] * len(BLOOD_GROUPS), [0] * len(BLOOD_GROUPS)
+
+    report = result["donors"] = _new_report()
+    if os.path.exists(paths["donors"]):
+        for chunk in _chunks(_iter_json_array(paths["donors"]), _validate_donor, chunk_size, report):
+            _upsert_donors(chunk, report)
+            if progress:
+                progress(f"donors: {report['rows']} read")
+    _finish_report(report)
+
+    now = _now()
+    report = result["inventory"] = _new_report()
+    if os.path.exists(paths["inventory"]):
+        for chunk in _chunks(_iter_json_array(paths["inventory"]), _validate_phase1_stock, chunk_size, report):
+            with transaction() as conn:
+                for line_no, (code, quantity) in chunk:
+                    expected_stock[code] += quantity
+                    if not quantity:
+                        continue
+                    donor_id = _synthetic(conn, "donors", PHASE1_DONOR, code, lambda name: conn.execute("""
+                        INSERT INTO donors (name, age, blood_group, synthetic) VALUES (?, 18, ?, 1)
+                    """, (name, code)).lastrowid)
+                    conn.execute("""
+                        INSERT INTO donations (donor_id, donation_code, blood_group, units, donation_date, expiry_date, remaining_units)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """, (donor_id, new_donation_code(), code, quantity, now, now + DONATION_EXPIRY_DAYS * 86400, quantity))
+                    report["inserted"] += 1
+            if progress:
+                progress(f"inventory: {report['rows']} read")
+    _finish_report(report)
+
+    report = result["requests"] = _new_report()
+    if os.path.exists(paths["requests"]):
+        recipients = {}
+        for chunk in _chunks(_iter_json_array(paths["requests"]), _validate_phase1_request, chunk_size, report):
+            with transaction() as conn:
+                rows = []
+                for line_no, (code, units, when) in chunk:
+                    expected_issued[code] += units
+                    if code not in recipients:
+                        # quantity_needed is set to the total issued once all requests are in.
+                        recipients[code] = _synthetic(conn, "recipients", PHASE1_RECIPIENT, code, lambda name: conn.execute("""
+                            INSERT INTO recipients (name, age, required_blood_group, quantity_needed, hospital_name, synthetic)
+                            VALUES (?, 1, ?, 1, 'Phase 1', 1)
+                        """, (name, code)).lastrowid)
+                    rows.append((recipients[code], code, code, units, when))
+                conn.executemany("""
+                    INSERT INTO issues (recipient_id, requested_blood_group, blood_group_issued, units, issue_date, compatible)
+                    VALUES (?, ?, ?, ?, ?, 1)
+                """, rows)
+                report["inserted"] += len(rows)
+            if progress:
+                progress(f"requests: {report['rows']} read")
+        with transaction() as conn:
+            conn.executemany("UPDATE recipients SET quantity_needed = ? WHERE id = ?",
+                             [(expected_issued[code], rid) for code, rid in recipients.items()])
+    _finish_report(report)
+
+    recalc_inventory()
+    backfill_rollups()
+    conn = get_conn()
+    live = dict(conn.execute("""
+        SELECT d.blood_group, SUM(d.remaining_units) FROM donations d JOIN donors o ON o.id = d.donor_id
+        WHERE o.name LIKE ? GROUP BY d.blood_group
+    """, (PHASE1_DONOR + " %",)).fetchall())
+    issued = dict(conn.execute("""
+        SELECT i.blood_group_issued, SUM(i.units) FROM issues i JOIN recipients r ON r.id = i.recipient_id
+        WHERE r.name LIKE ? GROUP BY i.blood_group_issued
+    """, (PHASE1_RECIPIENT + " %",)).fetchall())
+    result["reconcile"] = [(bg, expected_stock[code], live.get(code, 0), expected_issued[code], issued.get(code, 0))
+                           for bg, code in BG_CODE.items()]
+    return result
+
+# Archive
+# Closed-out history moves into per-month partition tables (archive_<kind>_YYYY_MM):
+# issues older than the window together with their lot allocations, and expired,
+# fully drawn donations that no hot issue still points at. archive_catalog records
+# each partition's date bounds so range reads open only the partitions they need, and
+# issue_carry keeps per-recipient issued totals for pending_recipients. The rollups
+# are left as they are, so reports keep covering archived days.
+ARCHIVE_AFTER_DAYS = 365
+_ARCHIVE_COLUMNS = {
+    "donations": "id, donor_id, donation_code, blood_group, units, donation_date, expiry_date, remaining_units",
+    "issues": "id, recipient_id, requested_blood_group, blood_group_issued, units, issue_date, compatible, status",
+    "allocations": "issue_id, donation_id, units",
+}
+
+def _month_bounds(month):
+    year, mon = int(month[:4]), int(month[5:])
+    return _ts(datetime(year, mon, 1)), _ts(datetime(year + mon // 12, mon % 12 + 1, 1))
+
+def _partition(conn, kind, month):
+    table = f"archive_{kind}_{month}"
+    hot = "issue_allocations" if kind == "allocations" else kind
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {table} AS SELECT {_ARCHIVE_COLUMNS[kind]} FROM {hot} WHERE 0")
+    return table
+
+def _catalog(conn, table, kind, month, first_at, last_at, rows):
+    conn.execute("""
+        INSERT INTO archive_catalog (table_name, kind, month, first_at, last_at, rows) VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (table_name) DO UPDATE SET first_at = MIN(first_at, excluded.first_at),
+            last_at = MAX(last_at, excluded.last_at), rows = rows + excluded.rows
+    """, (table, kind, month.replace("_", "-"), first_at, last_at, rows))
+
+def _history(kind, lo=None, hi=None):
+    # FROM source for donations or issues: the hot table plus the archive partitions
+    # whose dates overlap [lo, hi). Without archives this is just the hot table.
+    parts = [r[0] for r in get_conn().execute("""
+        SELECT table_name FROM archive_catalog
+        WHERE kind = ? AND (? IS NULL OR last_at >= ?) AND (? IS NULL OR first_at < ?)
+        ORDER BY month
+    """, (kind, lo, lo, hi, hi))]
+    if not parts:
+        return kind
+    return "(" + " UNION ALL ".join(f"SELECT {_ARCHIVE_COLUMNS[kind]} FROM {t}" for t in [kind] + parts) + f") AS {kind}"
+
+@retry_on_busy
+def archive_history(older_than_days=ARCHIVE_AFTER_DAYS):
+    # One transaction per month partition; returns the number of rows moved per kind.
+    cutoff = _now() - int(older_than_days) * 86400
+    moved = {"issues": 0, "donations": 0}
+    conn = get_conn()
+    months = [r[0] for r in conn.execute("""
+        SELECT DISTINCT strftime('%Y_%m', issue_date, 'unixepoch') FROM issues WHERE issue_date < ?
+    """, (cutoff,))]
+    for month in months:
+        lo, hi = _month_bounds(month)
+        span = (lo, min(hi, cutoff))
+        with transaction() as conn:
+            first, last, rows = conn.execute("""
+                SELECT MIN(issue_date), MAX(issue_date), COUNT(*) FROM issues WHERE issue_date >= ? AND issue_date < ?
+            """, span).fetchone()
+            if not rows:
+                continue
+            table = _partition(conn, "issues", month)
+            conn.execute(f"""
+                INSERT INTO {table} SELECT {_ARCHIVE_COLUMNS["issues"]} FROM issues WHERE issue_date >= ? AND issue_date < ?
+            """, span)
+            allocations = _partition(conn, "allocations", month)
+            drawn = conn.execute(f"""
+                INSERT INTO {allocations}
+                SELECT a.issue_id, a.donation_id, a.units FROM issue_allocations a JOIN issues i ON i.id = a.issue_id
+                WHERE i.issue_date >= ? AND i.issue_date < ?
+            """, span).rowcount
+            conn.execute("""
+                INSERT INTO issue_carry (recipient_id, units, entries)
+                SELECT recipient_id, SUM(units), COUNT(*) FROM issues WHERE issue_date >= ? AND issue_date < ?
+                GROUP BY recipient_id
+                ON CONFLICT (recipient_id) DO UPDATE SET units = units + excluded.units, entries = entries + excluded.entries
+            """, span)
+            # Allocations go with their issues through ON DELETE CASCADE.
+            conn.execute("DELETE FROM issues WHERE issue_date >= ? AND issue_date < ?", span)
+            _catalog(conn, table, "issues", month, first, last, rows)
+            _catalog(conn, allocations, "allocations", month, first, last, drawn)
+        moved["issues"] += rows
+    closed = """
+        donation_date >= ? AND donation_date < ? AND expiry_date < ? AND remaining_units = 0
+        AND NOT EXISTS (SELECT 1 FROM issue_allocations a WHERE a.donation_id = donations.id)
+    """
+    months = [r[0] for r in conn.execute("""
+        SELECT DISTINCT strftime('%Y_%m', donation_date, 'unixepoch') FROM donations
+        WHERE expiry_date < ? AND remaining_units = 0
+    """, (cutoff,))]
+    for month in months:
+        params = _month_bounds(month) + (cutoff,)
+        with transaction() as conn:
+            first, last, rows = conn.execute(f"""
+                SELECT MIN(donation_date), MAX(donation_date), COUNT(*) FROM donations WHERE {closed}
+            """, params).fetchone()
+            if not rows:
+                continue
+            table = _partition(conn, "donations", month)
+            conn.execute(f"INSERT INTO {table} SELECT {_ARCHIVE_COLUMNS['donations']} FROM donations WHERE {closed}", params)
+            conn.execute(f"DELETE FROM donations WHERE {closed}", params)
+            _catalog(conn, table, "donations", month, first, last, rows)
+        moved["donations"] += rows
+    return moved
+
+def archive_partitions():
+    return get_conn().execute(f"""
+        SELECT table_name, kind, month, {_ts_sql("first_at")} AS first_at, {_ts_sql("last_at")} AS last_at, rows
+        FROM archive_catalog ORDER BY kind, month
+    """).fetchall()
+
+# Streaming export
+# Iterators read in fetchmany batches so exports run in constant memory.
+# Date ranges are inclusive YYYY-MM-DD bounds.
+EXPORT_BATCH_SIZE = 1000
+EXPORT_KINDS = ("donors", "donations", "issues")
+
+def _iter_query(query, params, batch_size):
+    cur = get_conn().execute(query, params)
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            return
+        yield from rows
+
+def _date_bounds(start, end, days=False):
+    # [lo, hi) in epoch days when days is True, epoch seconds otherwise; None when open.
+    scale = 1 if days else 86400
+    lo = hi = None
+    if start:
+        check_date(start, "start")
+        lo = _parse_day(start) * scale
+    if end:
+        check_date(end, "end")
+        hi = (_parse_day(end) + 1) * scale
+    return lo, hi
+
+def _date_range(column, start, end, days=False, clauses=()):
+    lo, hi = _date_bounds(start, end, days)
+    clauses, params = list(clauses), []
+    if lo is not None:
+        clauses.append(f"{column} >= ?")
+        params.append(lo)
+    if hi is not None:
+        clauses.append(f"{column} < ?")
+        params.append(hi)
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+def iter_donors(start=None, end=None, batch_size=EXPORT_BATCH_SIZE):
+    # Range filters apply to last_donation_date.
+    where, params = _date_range("donors.last_donation_date", start, end, days=True, clauses=["NOT donors.synthetic"])
+    return _iter_query(f"SELECT {_DONOR_COLUMNS} FROM donors{where} ORDER BY donors.id", params, batch_size)
+
+def iter_donations(start=None, end=None, batch_size=EXPORT_BATCH_SIZE):
+    # Donations and issues include the archive partitions that overlap the range.
+    where, params = _date_range("donations.donation_date", start, end, clauses=[DONATED_SQL])
+    source = _history("donations", *_date_bounds(start, end))
+    return _iter_query(f"SELECT {_DONATION_COLUMNS} FROM {source}{where} ORDER BY donations.donation_date, donations.id",
+                       params, batch_size)
+
+def iter_issues(start=None, end=None, batch_size=EXPORT_BATCH_SIZE):
+    where, params = _date_range("issues.issue_date", start, end)
+    source = _history("issues", *_date_bounds(start, end))
+    return _iter_query(f"SELECT {_ISSUE_COLUMNS} FROM {source}{where} ORDER BY issues.issue_date, issues.id", params, batch_size)
+
+def export_rows(kind, out, fmt="csv", start=None, end=None):
+    rows = {"donors": iter_donors, "donations": iter_donations, "issues": iter_issues}[kind](start, end)
+    count = 0
+    writer = None
+    for r in rows:
+        if fmt == "jsonl":
+            out.write(json.dumps(dict(r)) + "\n")
+        else:
+            if writer is None:
+                writer = csv.writer(out)
+                writer.writerow(r.keys())
+            writer.writerow(tuple(r))
+        count += 1
+    return count
+
+# Instrumentation
+# Off by default. enable_instrumentation() swaps every public function in this module
+# for a timed wrapper and reopens connections as InstrumentedConnection; disabling
+# puts the originals back, so the normal path carries no extra calls.
+METRICS = instrumentation.Registry()
+_NOT_INSTRUMENTED = {"get_conn", "close_conn", "transaction", "retry_on_busy",
+                     "enable_instrumentation", "disable_instrumentation", "instrumentation_stats"}
+_uninstrumented = {}
+
+def enable_instrumentation(slow_query_ms=instrumentation.SLOW_QUERY_MS):
+    global _conn_factory
+    METRICS.slow_query_ms = slow_query_ms
+    if _uninstrumented:
+        return
+    module = globals()
+    for name, func in list(module.items()):
+        if (name.startswith("_") or name in _NOT_INSTRUMENTED or not inspect.isfunction(func)
+                or func.__module__ != __name__):
+            continue
+        _uninstrumented[name] = func
+        module[name] = METRICS.timed(name, func)
+    _conn_factory = InstrumentedConnection
+
+def disable_instrumentation():
+    global _conn_factory
+    globals().update(_uninstrumented)
+    _uninstrumented.clear()
+    _conn_factory = PooledConnection
+
+def instrumentation_stats(reset=False, fmt="dict"):
+    stats = METRICS.render_prometheus() if fmt == "prometheus" else METRICS.snapshot()
+    if reset:
+        METRICS.reset()
+    return stats
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Blood bank database maintenance")
+    parser.add_argument("--db", default=DB_FILE, help="SQLite database file")
+    parser.add_argument("--stats", choices=["json", "prometheus"],
+                        help="time calls and SQL for this command and print the stats to stderr")
+    parser.add_argument("--slow-ms", type=float, default=instrumentation.SLOW_QUERY_MS,
+                        help="log statements slower than this with --stats (default: %(default)s)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("migrate", help=f"convert an older database to schema v{SCHEMA_VERSION} in place")
+    p.add_argument("--chunk-size", type=int, default=MIGRATE_CHUNK_SIZE)
+    p = sub.add_parser("verify-inventory", help="recompute stock from history and report drift")
+    p.add_argument("--repair", action="store_true", help="overwrite the ledger with the recomputed values")
+    p = sub.add_parser("allocate", help="issue stock to all pending recipients in one pass")
+    p.add_argument("--dry-run", action="store_true", help="show the plan without issuing")
+    sub.add_parser("expiry-daemon", help="retire lots as they expire and print low-stock events")
+    p = sub.add_parser("wastage", help="units retired at expiry per blood group")
+    p.add_argument("--from", dest="start", help="first expiry day, YYYY-MM-DD")
+    p.add_argument("--to", dest="end", help="last expiry day, YYYY-MM-DD")
+    sub.add_parser("backfill-rollups", help="rebuild the daily report rollups from history")
+    p = sub.add_parser("archive", help="move closed-out donations and issues into per-month archive tables")
+    p.add_argument("--older-than", type=int, default=ARCHIVE_AFTER_DAYS, help="days of history to keep hot")
+    p = sub.add_parser("import", help="bulk load donors, recipients or donations from CSV/JSONL")
+    p.add_argument("kind", choices=["donors", "recipients", "donations"])
+    p.add_argument("path")
+    p.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    p = sub.add_parser("import-phase1", help="migrate a Phase 1 JSON data directory into this database")
+    p.add_argument("directory", nargs="?", default=".", help="folder holding donors.json, inventory.json and requests.json")
+    p.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    p = sub.add_parser("export", help="stream donors, donations or issues as CSV/JSONL")
+    p.add_argument("kind", choices=EXPORT_KINDS)
+    p.add_argument("--format", choices=["csv", "jsonl"], default="csv")
+    p.add_argument("--from", dest="start", help="first day, YYYY-MM-DD")
+    p.add_argument("--to", dest="end", help="last day, YYYY-MM-DD")
+    p.add_argument("-o", "--output", help="file to write (default: stdout)")
+    args = parser.parse_args()
+    DB_FILE = args.db
+    if args.stats:
+        enable_instrumentation(slow_query_ms=args.slow_ms)
+    if args.command == "migrate":
+        init_db(migrate_chunk_size=args.chunk_size, progress=lambda msg: print(msg, flush=True))
+        print(f"Schema version {SCHEMA_VERSION}.")
+    else:
+        init_db()
+    if args.command == "verify-inventory":
+        drift = verify_inventory(repair=args.repair)
+        for bg, recorded, expected in drift:
+            print(f"{bg}: ledger {recorded}, history {expected}")
+        print(("Repaired" if args.repair else "Drifted") + f" groups: {len(drift)}" if drift else "Inventory consistent.")
+    elif args.command == "allocate":
+        result = allocate_pending(dry_run=args.dry_run)
+        for recipient_id, requested, issued_group, units in result["issued"]:
+            print(f"recipient {recipient_id} ({requested}): {units} x {issued_group}")
+        for recipient_id, requested, units in result["unmet"]:
+            print(f"recipient {recipient_id} ({requested}): {units} unit(s) unmet")
+        print(("Planned" if args.dry_run else "Issued") + f" {result['units_issued']} units, {result['units_unmet']} unmet.")
+    elif args.command == "expiry-daemon":
+        add_low_stock_listener(lambda bg, units: print(f"{datetime.now():%Y-%m-%d %H:%M:%S} low stock: {bg} at {units} unit(s)",
+                                                       flush=True))
+        scheduler = ExpiryScheduler().start()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            scheduler.stop()
+    elif args.command == "wastage":
+        for r in wastage_report(args.start, args.end):
+            print(f"{r['blood_group']}: {r['units']} unit(s) in {r['lots']} lot(s)")
+    elif args.command == "backfill-rollups":
+        backfill_rollups()
+        print("Rollups rebuilt.")
+    elif args.command == "archive":
+        moved = archive_history(args.older_than)
+        for r in archive_partitions():
+            print(f"{r['table_name']}: {r['rows']} rows, {r['first_at']} to {r['last_at']}")
+        print(f"Archived {moved['issues']} issues and {moved['donations']} donations.")
+    elif args.command == "import":
+        loader = {"donors": bulk_import_donors, "recipients": bulk_import_recipients,
+                  "donations": bulk_import_donations}[args.kind]
+        report = loader(args.path, chunk_size=args.chunk_size)
+        for line_no, reason in report["rejects"]:
+            print(f"rejected line {line_no}: {reason}")
+        print(f"{report['rows']} rows in {report['seconds']:.2f}s ({report['rows_per_sec']:.0f} rows/sec): "
+              f"{report['inserted']} inserted, {report['updated']} updated, "
+              f"{report['duplicates']} duplicates, {report['rejected']} rejected")
+    elif args.command == "import-phase1":
+        result = migrate_phase1(args.directory, chunk_size=args.chunk_size, progress=print)
+        for kind in ("donors", "inventory", "requests"):
+            report = result[kind]
+            for line_no, reason in report["rejects"]:
+                print(f"{kind}.json element {line_no} rejected: {reason}")
+            print(f"{kind}: {report['rows']} read in {report['seconds']:.2f}s, {report['inserted']} inserted, "
+                  f"{report['updated']} updated, {report['duplicates']} duplicates, {report['rejected']} rejected")
+        print(f"{'group':6s} {'stock':>8s} {'lots':>8s} {'issued':>8s} {'issues':>8s}")
+        for bg, stock, lots, issued, issues in result["reconcile"]:
+            flag = "" if (stock, issued) == (lots, issues) else "  MISMATCH"
+            print(f"{bg:6s} {stock:8d} {lots:8d} {issued:8d} {issues:8d}{flag}")
+    elif args.command == "export":
+        out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+        try:
+            count = export_rows(args.kind, out, fmt=args.format, start=args.start, end=args.end)
+        finally:
+            if args.output:
+                out.close()
+        print(f"Exported {count} {args.kind}.", file=sys.stderr)
+    if args.stats:
+        stats = instrumentation_stats(fmt=args.stats)
+        print(stats if args.stats == "prometheus" else json.dumps(stats, indent=2), file=sys.stderr)
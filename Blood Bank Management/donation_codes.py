@@ -0,0 +1,44 @@
+# Donation code generator shared by database.py and phase3_flask.py
+# A code is "D-" followed by 20 Crockford base32 characters packing
+#   48-bit Unix time in ms | 32-bit process node | 16-bit sequence
+# Codes from one process are strictly increasing, and codes from different processes
+# sort by time, so new rows land at the right-hand end of the UNIQUE index.
+import os
+import random
+import threading
+import time
+
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+CODE_CHARS = 20
+MAX_SEQUENCE = 0xFFFF
+
+_lock = threading.Lock()
+_state = {"node": 0, "ms": 0, "seq": 0}
+
+def _reseed():
+    # A fresh random node per process; forked children must not share the parent's.
+    _state.update(node=random.SystemRandom().getrandbits(32), ms=0, seq=0)
+
+_reseed()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reseed)
+
+def _encode(value):
+    chars = []
+    for _ in range(CODE_CHARS):
+        chars.append(ALPHABET[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+def new_donation_code(prefix="D-"):
+    with _lock:
+        ms = time.time_ns() // 1_000_000
+        if ms > _state["ms"]:
+            _state["ms"], _state["seq"] = ms, 0
+        elif _state["seq"] < MAX_SEQUENCE:
+            _state["seq"] += 1
+        else:
+            # Sequence exhausted for this millisecond (or the clock went back): borrow the next one.
+            _state["ms"], _state["seq"] = _state["ms"] + 1, 0
+        value = (_state["ms"] << 48) | (_state["node"] << 16) | _state["seq"]
+    return prefix + _encode(value)
@@ -0,0 +1,80 @@
+# Demand forecast shared by database.py and phase3_flask.py
+# Daily issued units per blood group are smoothed into an exponentially weighted daily
+# rate with multiplicative weekday factors (Holt-Winters without a trend term). Callers
+# feed complete days in order through Forecaster.advance(), so a refresh only reads the
+# days since the previous one. days_of_supply() walks the live lots forward a day at a
+# time, dropping units as they expire and drawing the forecast demand first-expiry-first-out.
+ALPHA = 0.1          # weight of the newest day in the daily rate
+SEASON_ALPHA = 0.05  # weight of the newest day in its weekday factor
+SEASON_BOUNDS = (0.2, 5.0)
+HORIZON_DAYS = 60
+WARNING_DAYS = 7
+CRITICAL_DAYS = 3
+
+def weekday(day):
+    # Monday is 0, as in datetime.weekday(); epoch day 0 was a Thursday.
+    return (day + 3) % 7
+
+class DemandModel:
+    __slots__ = ("level", "season")
+
+    def __init__(self):
+        self.level = None
+        self.season = [1.0] * 7
+
+    def fold(self, day, units):
+        wd = weekday(day)
+        if self.level is None:
+            self.level = float(units)
+            return
+        factor = self.season[wd]
+        self.level += ALPHA * (units / factor - self.level)
+        if self.level > 0:
+            lo, hi = SEASON_BOUNDS
+            self.season[wd] = min(hi, max(lo, factor + SEASON_ALPHA * (units / self.level - factor)))
+            mean = sum(self.season) / 7
+            self.season = [f / mean for f in self.season]
+
+    def demand(self, day):
+        return 0.0 if self.level is None else self.level * self.season[weekday(day)]
+
+class Forecaster:
+    def __init__(self, groups):
+        self.models = {g: DemandModel() for g in groups}
+        self.last_day = None  # last complete day folded in
+
+    def advance(self, daily, through_day):
+        # daily maps (epoch day, group) to units issued for days after last_day; days
+        # missing from it had no demand. The first call starts at the earliest day given.
+        if self.last_day is None:
+            if not daily:
+                return
+            self.last_day = min(day for day, _ in daily) - 1
+        for day in range(self.last_day + 1, through_day + 1):
+            for g, model in self.models.items():
+                model.fold(day, daily.get((day, g), 0))
+        self.last_day = max(self.last_day, through_day)
+
+    def demand(self, group, day):
+        return self.models[group].demand(day)
+
+def days_of_supply(lots, demand, horizon=HORIZON_DAYS):
+    # lots: (units, days until expiry) pairs; demand(k): expected units on day k from now.
+    # Returns (days of supply, units that expire unused within the horizon). Days of
+    # supply is None when the stock outlasts the horizon.
+    lots = sorted([expires, units] for units, expires in lots if units > 0)
+    expiring = 0
+    for k in range(horizon):
+        while lots and lots[0][0] < k:
+            expiring += lots.pop(0)[1]
+        need = demand(k)
+        available = sum(units for _, units in lots)
+        if need > available:
+            return k + available / need, expiring
+        while need > 0 and lots:
+            take = min(need, lots[0][1])
+            lots[0][1] -= take
+            need -= take
+            if lots[0][1] <= 0:
+                lots.pop(0)
+    return None, expiring
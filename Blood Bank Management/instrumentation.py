@@ -0,0 +1,154 @@
+# Latency histograms shared by database.py and phase3_flask.py
+# Nothing here runs until a caller opts in (database.enable_instrumentation(),
+# BLOOD_BANK_METRICS=1 for the Flask app). Stats render as a dict or Prometheus text.
+import bisect
+import functools
+import logging
+import threading
+import time
+
+# Bucket upper bounds in seconds; anything slower lands in +Inf.
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SLOW_QUERY_MS = 100
+MAX_STATEMENTS = 500  # distinct SQL texts tracked; further ones are folded into "other"
+
+slow_log = logging.getLogger("blood_bank.slow_sql")
+
+class Histogram:
+    __slots__ = ("buckets", "count", "total", "max")
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation (the max for +Inf).
+        rank, seen = q * self.count, 0
+        for bound, n in zip(BUCKETS, self.buckets):
+            seen += n
+            if n and seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def as_dict(self):
+        return {"count": self.count, "total_ms": round(self.total * 1000, 3),
+                "mean_ms": round(self.total * 1000 / self.count, 3) if self.count else 0.0,
+                "p50_ms": round(self.quantile(0.5) * 1000, 3), "p95_ms": round(self.quantile(0.95) * 1000, 3),
+                "p99_ms": round(self.quantile(0.99) * 1000, 3), "max_ms": round(self.max * 1000, 3)}
+
+def _statement_key(sql):
+    return " ".join(sql.split())[:200]
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+class Registry:
+    def __init__(self, prefix="blood_bank", call_label="function", slow_query_ms=SLOW_QUERY_MS):
+        self.prefix = prefix
+        self.call_label = call_label
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.calls = {}
+            self.errors = {}
+            self.sql = {}
+            self.statements = 0
+            self.slow_queries = 0
+
+    def observe_call(self, name, seconds, failed=False):
+        with self._lock:
+            hist = self.calls.get(name)
+            if hist is None:
+                hist = self.calls[name] = Histogram()
+            hist.observe(seconds)
+            if failed:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def count_statement(self, sql=None):
+        # sqlite3 trace callback: fires for every statement, including triggers, scripts and FTS internals.
+        with self._lock:
+            self.statements += 1
+
+    def observe_sql(self, sql, params, seconds, expanded=None):
+        key = _statement_key(sql)
+        with self._lock:
+            hist = self.sql.get(key)
+            if hist is None:
+                if len(self.sql) >= MAX_STATEMENTS:
+                    key = "other"
+                hist = self.sql.setdefault(key, Histogram())
+            hist.observe(seconds)
+            slow = self.slow_query_ms is not None and seconds * 1000 >= self.slow_query_ms
+            if slow:
+                self.slow_queries += 1
+        if slow:
+            slow_log.warning("slow query %.1f ms: %s params=%r", seconds * 1000,
+                             _statement_key(expanded or sql), params)
+
+    def timed(self, name, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            failed = True
+            try:
+                result = func(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                self.observe_call(name, time.perf_counter() - start, failed)
+        return wrapper
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "calls": {name: dict(h.as_dict(), errors=self.errors.get(name, 0)) for name, h in sorted(self.calls.items())},
+                "sql": {key: h.as_dict() for key, h in sorted(self.sql.items(), key=lambda kv: -kv[1].total)},
+                "statements": self.statements,
+                "slow_queries": self.slow_queries,
+            }
+
+    def render_prometheus(self):
+        lines = []
+        with self._lock:
+            self._render_histograms(lines, f"{self.prefix}_call_seconds", "Latency of instrumented calls",
+                                    self.call_label, self.calls)
+            lines.append(f"# HELP {self.prefix}_call_errors_total Instrumented calls that raised")
+            lines.append(f"# TYPE {self.prefix}_call_errors_total counter")
+            for name, n in sorted(self.errors.items()):
+                lines.append(f'{self.prefix}_call_errors_total{{{self.call_label}="{_label(name)}"}} {n}')
+            self._render_histograms(lines, f"{self.prefix}_sql_seconds", "Latency of SQL statements",
+                                    "statement", self.sql)
+            for metric, value, help_text in ((f"{self.prefix}_sql_statements_total", self.statements,
+                                              "SQL statements run, including trigger bodies and FTS internals"),
+                                             (f"{self.prefix}_slow_queries_total", self.slow_queries,
+                                              f"SQL statements slower than {self.slow_query_ms} ms")):
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} counter")
+                lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _render_histograms(lines, metric, help_text, label, hists):
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} histogram")
+        for name, h in sorted(hists.items()):
+            tag = f'{label}="{_label(name)}"'
+            cumulative = 0
+            for bound, n in zip(BUCKETS, h.buckets):
+                cumulative += n
+                lines.append(f'{metric}_bucket{{{tag},le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{{tag},le="+Inf"}} {h.count}')
+            lines.append(f"{metric}_sum{{{tag}}} {h.total:.6f}")
+            lines.append(f"{metric}_count{{{tag}}} {h.count}")
@@ -1,160 +1,491 @@
-# Phase 1 — CLI (JSON storage)
-import json
-import os
-from datetime import datetime
-
-DONORS_FILE = "donors.json"
-INVENTORY_FILE = "inventory.json"
-REQUESTS_FILE = "requests.json"
-
-BLOOD_GROUPS = ["O-", "O+", "A-", "A+", "B-", "B+", "AB-", "AB+"]
-
-def init_files():
-    for fp in [DONORS_FILE, INVENTORY_FILE, REQUESTS_FILE]:
-        if not os.path.exists(fp):
-            with open(fp, "w", encoding="utf-8") as f:
-                json.dump([], f)
-
-def load(fp):
-    with open(fp, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-def save(fp, data):
-    with open(fp, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2)
-
-def normalize_bg(bg):
-    bg = (bg or "").strip().upper()
-    if bg not in BLOOD_GROUPS:
-        raise ValueError("Invalid blood group. Allowed: " + ", ".join(BLOOD_GROUPS))
-    return bg
-
-# Donor Management
-def add_donor():
-    donors = load(DONORS_FILE)
-    name = input("Name: ").strip()
-    age = int(input("Age: ").strip())
-    gender = input("Gender (Male/Female/Other): ").strip().title()
-    phone = input("Phone: ").strip()
-    address = input("Address: ").strip()
-    blood_group = normalize_bg(input("Blood Group: ").strip())
-    last_donation_date = input("Last donation date (YYYY-MM-DD or blank): ").strip()
-    if last_donation_date:
-        try:
-            datetime.strptime(last_donation_date, "%Y-%m-%d")
-        except ValueError:
-            print("Invalid date. Use YYYY-MM-DD.")
-            return
-    donor_id = (max([d.get("id", 0) for d in donors]) + 1) if donors else 1
-    donors.append({
-        "id": donor_id,
-        "name": name,
-        "age": age,
-        "gender": gender,
-        "phone": phone,
-        "address": address,
-        "blood_group": blood_group,
-        "last_donation_date": last_donation_date or None
-    })
-    save(DONORS_FILE, donors)
-    print("Donor added.")
-
-def view_donors():
-    donors = load(DONORS_FILE)
-    if not donors:
-        print("No donors found.")
-        return
-    for d in donors:
-        print(f"{d['id']}: {d['name']} | {d['blood_group']} | Last donation: {d.get('last_donation_date') or 'N/A'}")
-
-# Inventory
-def add_inventory():
-    inv = load(INVENTORY_FILE)
-    blood_group = normalize_bg(input("Blood Group: ").strip())
-    qty = int(input("Quantity (units): ").strip())
-    found = next((i for i in inv if i["blood_group"] == blood_group), None)
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    if found:
-        found["quantity"] += qty
-        found["last_updated"] = now
-    else:
-        inv.append({"blood_group": blood_group, "quantity": qty, "last_updated": now})
-    save(INVENTORY_FILE, inv)
-    print("Inventory updated.")
-
-def view_inventory():
-    inv = load(INVENTORY_FILE)
-    if not inv:
-        print("Inventory empty.")
-        return
-    for i in inv:
-        print(f"{i['blood_group']}: {i['quantity']} units (updated {i['last_updated']})")
-
-# Requests / Issue
-def issue_blood():
-    inv = load(INVENTORY_FILE)
-    reqs = load(REQUESTS_FILE)
-    blood_group = normalize_bg(input("Requested Blood Group: ").strip())
-    qty = int(input("Quantity (units): ").strip())
-    item = next((i for i in inv if i["blood_group"] == blood_group), None)
-    if not item:
-        print("Blood group not available.")
-        return
-    if item["quantity"] < qty:
-        print(f"Insufficient stock. Available: {item['quantity']}")
-        return
-    item["quantity"] -= qty
-    item["last_updated"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    reqs.append({
-        "id": (max([r.get("id", 0) for r in reqs]) + 1) if reqs else 1,
-        "blood_group": blood_group,
-        "quantity": qty,
-        "issue_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    })
-    save(INVENTORY_FILE, inv)
-    save(REQUESTS_FILE, reqs)
-    print("Blood issued.")
-
-def view_requests():
-    reqs = load(REQUESTS_FILE)
-    if not reqs:
-        print("No requests.")
-        return
-    for r in reqs:
-        print(f"{r['id']}: {r['blood_group']} - {r['quantity']} unit(s) at {r['issue_date']}")
-
-def main():
-    init_files()
-    while True:
-        print("\n=== Phase 1 CLI (JSON) ===")
-        print("1. Add Donor")
-        print("2. View Donors")
-        print("3. Add Blood to Inventory")
-        print("4. View Inventory")
-        print("5. Issue Blood")
-        print("6. View Requests")
-        print("0. Exit")
-        ch = input("Choose: ").strip()
-        try:
-            if ch == "1":
-                add_donor()
-            elif ch == "2":
-                view_donors()
-            elif ch == "3":
-                add_inventory()
-            elif ch == "4":
-                view_inventory()
-            elif ch == "5":
-                issue_blood()
-            elif ch == "6":
-                view_requests()
-            elif ch == "0":
-                print("Bye.")
-                break
-            else:
-                print("Invalid choice.")
-        except Exception as e:
-            print("Error:", e)
-
-if __name__ == "__main__":
-    main()
\ No newline at end of file
+# Phase 1 — CLI (JSON storage)
+import argparse
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+DONORS_FILE = "donors.json"
+INVENTORY_FILE = "inventory.json"
+REQUESTS_FILE = "requests.json"
+JOURNAL_FILE = "journal.jsonl"
+SNAPSHOT_FILE = "snapshot.json"
+LOCK_FILE = "phase1.lock"
+COMPACT_EVERY = 1000
+CHECKPOINT_EVERY = 10000
+
+BLOOD_GROUPS = ["O-", "O+", "A-", "A+", "B-", "B+", "AB-", "AB+"]
+
+def init_files():
+    for fp in [DONORS_FILE, INVENTORY_FILE, REQUESTS_FILE]:
+        if not os.path.exists(fp):
+            save(fp, [])
+
+def load(fp):
+    with open(fp, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save(fp, data, indent=2):
+    # Written to a temp file, fsynced and renamed over fp, so readers and crashes only
+    # ever see the old file or the new one.
+    tmp = f"{fp}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(json.dumps(data, indent=indent))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, fp)
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(os.path.dirname(os.path.abspath(fp)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+def _stamp(fp):
+    try:
+        st = os.stat(fp)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+def _size(fp):
+    try:
+        return os.path.getsize(fp)
+    except FileNotFoundError:
+        return 0
+
+def normalize_bg(bg):
+    bg = (bg or "").strip().upper()
+    if bg not in BLOOD_GROUPS:
+        raise ValueError("Invalid blood group. Allowed: " + ", ".join(BLOOD_GROUPS))
+    return bg
+
+# Store
+# JsonStore keeps the three lists in memory, indexed by id and blood group, with
+# counters for the next ids. Every operation takes an advisory lock on LOCK_FILE and
+# first picks up what other processes wrote since this one last looked (a stat check,
+# or the journal records past its offset), so concurrent CLIs never overwrite each
+# other. Changes are persisted by an atomic rewrite of the files they touch, or in
+# journal mode by one appended record. Inside `with store.batch():` the writes of
+# several operations go out together, with a single fsync.
+#
+# Journal mode (--journal): each change is one {"seq", "op", ...} line in JOURNAL_FILE,
+# so an add costs the same however much data there is. The state is SNAPSHOT_FILE plus
+# a replay of the records after the snapshot's seq. Every COMPACT_EVERY records, and on
+# exit, the state is written to a new snapshot and the journal is truncated; the three
+# JSON files are refreshed at the same time so other tools can still read them.
+#
+# Both modes load the same way: SNAPSHOT_FILE when it exists, else the three JSON files,
+# plus the journal. A journal-mode store that finds no snapshot writes one before its
+# first record, so records always sit on a snapshot. A plain-mode write on top of a
+# snapshot folds it in: the state is compacted, then the snapshot is removed, leaving
+# the JSON files as the whole state again. Either mode therefore sees what the other
+# wrote last, whichever ran first.
+_FILES = {"donors": DONORS_FILE, "inventory": INVENTORY_FILE, "requests": REQUESTS_FILE}
+_TOUCHES = {"donor": ("donors",), "stock": ("inventory",), "issue": ("inventory", "requests")}
+
+class JsonStore:
+    def __init__(self, journal=False):
+        self.journal = journal
+        self._depth = 0
+        self._lock_fd = None
+        self._batching = 0
+        self._dirty = set()
+        self._lines = []
+        self._file = None
+        init_files()
+        if journal:
+            self._file = open(JOURNAL_FILE, "ab")
+        with self.locked():
+            self._reload()
+
+    # Locking
+    @contextmanager
+    def locked(self):
+        if not self._depth:
+            self._lock_fd = open(LOCK_FILE, "a+b")
+            if fcntl:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            else:
+                self._lock_fd.seek(0)
+                msvcrt.locking(self._lock_fd.fileno(), msvcrt.LK_LOCK, 1)
+        self._depth += 1
+        try:
+            yield self
+        finally:
+            self._depth -= 1
+            if not self._depth:
+                if fcntl:
+                    fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+                else:
+                    self._lock_fd.seek(0)
+                    msvcrt.locking(self._lock_fd.fileno(), msvcrt.LK_UNLCK, 1)
+                self._lock_fd.close()
+                self._lock_fd = None
+
+    @contextmanager
+    def batch(self):
+        # Holds the lock throughout, so the state is refreshed once on entry.
+        with self.locked():
+            self.refresh()
+            self._batching += 1
+            try:
+                yield self
+            finally:
+                self._batching -= 1
+                if not self._batching:
+                    self.flush()
+
+    # Loading
+    def _index(self, donors, inventory, requests):
+        self.donors, self.inventory, self.requests = donors, inventory, requests
+        self.donors_by_id = {d.get("id"): d for d in donors}
+        self.donors_by_group = {}
+        for d in donors:
+            self.donors_by_group.setdefault(d["blood_group"], []).append(d)
+        self.stock = {i["blood_group"]: i for i in inventory}
+        self.next_donor_id = max((d.get("id", 0) for d in donors), default=0) + 1
+        self.next_request_id = max((r.get("id", 0) for r in requests), default=0) + 1
+
+    def _reload(self):
+        self._stamps = {fp: _stamp(fp) for fp in _FILES.values()}
+        self._stamps[SNAPSHOT_FILE] = _stamp(SNAPSHOT_FILE)
+        if self._stamps[SNAPSHOT_FILE]:
+            snap = load(SNAPSHOT_FILE)
+        else:
+            snap = {"seq": 0, "donors": load(DONORS_FILE), "inventory": load(INVENTORY_FILE), "requests": load(REQUESTS_FILE)}
+        self._index(snap["donors"], snap["inventory"], snap["requests"])
+        self.seq, self.pending, self._offset = snap["seq"], 0, 0
+        self._replay()
+        if _size(JOURNAL_FILE) > self._offset:
+            # A torn last write from a crash; safe to cut since we hold the lock.
+            os.truncate(JOURNAL_FILE, self._offset)
+        if self.journal and not self._stamps[SNAPSHOT_FILE]:
+            self.compact()
+
+    def _replay(self):
+        if not os.path.exists(JOURNAL_FILE):
+            return
+        with open(JOURNAL_FILE, "rb") as f:
+            f.seek(self._offset)
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    break
+                self._offset += len(line)
+                if rec["seq"] > self.seq:
+                    self._apply(rec)
+                    self.seq = rec["seq"]
+                    self.pending += 1
+
+    def refresh(self):
+        # Brings the in-memory state up to date with other processes' writes, in either
+        # mode: the JSON files, the snapshot and the journal are all watched.
+        if self._batching:
+            return self
+        if any(_stamp(fp) != stamp for fp, stamp in self._stamps.items()) or _size(JOURNAL_FILE) < self._offset:
+            self._reload()
+        else:
+            self._replay()
+        return self
+
+    def current(self):
+        with self.locked():
+            return self.refresh()
+
+    # Writing
+    def _apply(self, rec):
+        if rec["op"] == "donor":
+            donor = rec["donor"]
+            self.donors.append(donor)
+            self.donors_by_id[donor["id"]] = donor
+            self.donors_by_group.setdefault(donor["blood_group"], []).append(donor)
+            self.next_donor_id = max(self.next_donor_id, donor["id"] + 1)
+        elif rec["op"] == "stock":
+            found = self.stock.get(rec["blood_group"])
+            if found:
+                found["quantity"] += rec["quantity"]
+                found["last_updated"] = rec["at"]
+            else:
+                found = self.stock[rec["blood_group"]] = {"blood_group": rec["blood_group"], "quantity": rec["quantity"],
+                                                          "last_updated": rec["at"]}
+                self.inventory.append(found)
+        elif rec["op"] == "issue":
+            item = self.stock[rec["blood_group"]]
+            item["quantity"] -= rec["quantity"]
+            item["last_updated"] = rec["at"]
+            self.requests.append({"id": rec["id"], "blood_group": rec["blood_group"], "quantity": rec["quantity"],
+                                  "issue_date": rec["at"]})
+            self.next_request_id = max(self.next_request_id, rec["id"] + 1)
+
+    def _record(self, rec):
+        # Called with the lock held and the state refreshed.
+        self._apply(rec)
+        if self.journal:
+            self.seq += 1
+            self._lines.append(json.dumps(dict(rec, seq=self.seq)) + "\n")
+        else:
+            self._dirty.update(_TOUCHES[rec["op"]])
+        if not self._batching:
+            self.flush()
+
+    def flush(self):
+        with self.locked():
+            if self._lines:
+                data = "".join(self._lines).encode("utf-8")
+                self._file.write(data)
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._offset += len(data)
+                self.pending += len(self._lines)
+                self._lines = []
+                if self.pending >= COMPACT_EVERY:
+                    self.compact()
+            if self._dirty and (self._stamps[SNAPSHOT_FILE] or self._offset):
+                # Plain mode on top of journal state: fold it into the JSON files.
+                self.compact()
+                os.remove(SNAPSHOT_FILE)
+                self._stamps[SNAPSHOT_FILE] = None
+                self._dirty.clear()
+            for key in sorted(self._dirty):
+                save(_FILES[key], getattr(self, key))
+                self._stamps[_FILES[key]] = _stamp(_FILES[key])
+            self._dirty.clear()
+
+    def compact(self):
+        with self.locked():
+            save(SNAPSHOT_FILE, {"seq": self.seq, "donors": self.donors, "inventory": self.inventory,
+                                 "requests": self.requests}, indent=None)
+            self._stamps[SNAPSHOT_FILE] = _stamp(SNAPSHOT_FILE)
+            # Records up to seq are in the snapshot now; replay skips them if truncating fails.
+            if os.path.exists(JOURNAL_FILE):
+                os.truncate(JOURNAL_FILE, 0)
+            self._offset = self.pending = 0
+            for key, fp in _FILES.items():
+                save(fp, getattr(self, key))
+                self._stamps[fp] = _stamp(fp)
+
+    def close(self):
+        if self.journal and self._file:
+            with self.locked():
+                self.refresh()
+                self.flush()
+                self.compact()
+            self._file.close()
+            self._file = None
+
+    # Operations
+    def add_donor(self, name, age, gender, phone, address, blood_group, last_donation_date=None):
+        blood_group = normalize_bg(blood_group)
+        if last_donation_date:
+            datetime.strptime(last_donation_date, "%Y-%m-%d")
+        with self.locked():
+            self.refresh()
+            donor_id = self.next_donor_id
+            self._record({"op": "donor", "donor": {
+                "id": donor_id,
+                "name": name,
+                "age": int(age),
+                "gender": gender,
+                "phone": phone,
+                "address": address,
+                "blood_group": blood_group,
+                "last_donation_date": last_donation_date or None
+            }})
+        return donor_id
+
+    def add_stock(self, blood_group, quantity):
+        blood_group = normalize_bg(blood_group)
+        with self.locked():
+            self.refresh()
+            self._record({"op": "stock", "blood_group": blood_group, "quantity": int(quantity),
+                          "at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
+
+    def issue(self, blood_group, quantity):
+        blood_group = normalize_bg(blood_group)
+        quantity = int(quantity)
+        with self.locked():
+            self.refresh()
+            item = self.stock.get(blood_group)
+            if not item:
+                raise ValueError("Blood group not available.")
+            if item["quantity"] < quantity:
+                raise ValueError(f"Insufficient stock. Available: {item['quantity']}")
+            request_id = self.next_request_id
+            self._record({"op": "issue", "id": request_id, "blood_group": blood_group, "quantity": quantity,
+                          "at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
+        return request_id
+
+store = None
+
+# Donor Management
+def add_donor():
+    name = input("Name: ").strip()
+    age = int(input("Age: ").strip())
+    gender = input("Gender (Male/Female/Other): ").strip().title()
+    phone = input("Phone: ").strip()
+    address = input("Address: ").strip()
+    blood_group = normalize_bg(input("Blood Group: ").strip())
+    last_donation_date = input("Last donation date (YYYY-MM-DD or blank): ").strip()
+    if last_donation_date:
+        try:
+            datetime.strptime(last_donation_date, "%Y-%m-%d")
+        except ValueError:
+            print("Invalid date. Use YYYY-MM-DD.")
+            return
+    store.add_donor(name, age, gender, phone, address, blood_group, last_donation_date)
+    print("Donor added.")
+
+def view_donors():
+    donors = store.current().donors
+    if not donors:
+        print("No donors found.")
+        return
+    for d in donors:
+        print(f"{d['id']}: {d['name']} | {d['blood_group']} | Last donation: {d.get('last_donation_date') or 'N/A'}")
+
+# Inventory
+def add_inventory():
+    blood_group = normalize_bg(input("Blood Group: ").strip())
+    qty = int(input("Quantity (units): ").strip())
+    store.add_stock(blood_group, qty)
+    print("Inventory updated.")
+
+def view_inventory():
+    inv = store.current().inventory
+    if not inv:
+        print("Inventory empty.")
+        return
+    for i in inv:
+        print(f"{i['blood_group']}: {i['quantity']} units (updated {i['last_updated']})")
+
+# Requests / Issue
+def issue_blood():
+    blood_group = normalize_bg(input("Requested Blood Group: ").strip())
+    qty = int(input("Quantity (units): ").strip())
+    try:
+        store.issue(blood_group, qty)
+    except ValueError as e:
+        print(e)
+        return
+    print("Blood issued.")
+
+def view_requests():
+    reqs = store.current().requests
+    if not reqs:
+        print("No requests.")
+        return
+    for r in reqs:
+        print(f"{r['id']}: {r['blood_group']} - {r['quantity']} unit(s) at {r['issue_date']}")
+
+# Batch mode (--batch FILE, or - for stdin)
+# One JSON command per line, named after the menu actions:
+#   {"cmd": "add_donor", "name": ..., "age": ..., "blood_group": ..., "gender": ..., ...}
+#   {"cmd": "add_inventory", "blood_group": ..., "quantity": ...}
+#   {"cmd": "issue_blood", "blood_group": ..., "quantity": ...}
+# Everything runs inside one store.batch(): the data is loaded once and written every
+# CHECKPOINT_EVERY commands and at the end. Each command's result is printed as a JSON
+# line; a failed command changes nothing and the batch carries on.
+def _batch_command(rec):
+    if not isinstance(rec, dict):
+        raise ValueError("command must be a JSON object")
+    cmd = rec.get("cmd")
+    if cmd == "add_donor":
+        return {"id": store.add_donor(rec["name"].strip(), rec["age"], (rec.get("gender") or "").strip().title(),
+                                      rec.get("phone"), rec.get("address"), rec["blood_group"],
+                                      rec.get("last_donation_date"))}
+    if cmd == "add_inventory":
+        blood_group = normalize_bg(rec["blood_group"])
+        store.add_stock(blood_group, rec["quantity"])
+        return {"blood_group": blood_group, "quantity": store.stock[blood_group]["quantity"]}
+    if cmd == "issue_blood":
+        return {"id": store.issue(rec["blood_group"], rec["quantity"])}
+    raise ValueError(f"Unknown cmd {cmd!r}. Allowed: add_donor, add_inventory, issue_blood")
+
+def run_batch(lines, out, checkpoint=CHECKPOINT_EVERY):
+    counts = {"ok": 0, "failed": 0}
+    started = time.perf_counter()
+    with store.batch():
+        for line_no, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                result = dict(_batch_command(json.loads(line)), line=line_no, ok=True)
+                counts["ok"] += 1
+            except (ValueError, TypeError, KeyError, AttributeError) as e:
+                result = {"line": line_no, "ok": False, "error": str(e) if not isinstance(e, KeyError) else f"missing {e}"}
+                counts["failed"] += 1
+            out.write(json.dumps(result) + "\n")
+            if (counts["ok"] + counts["failed"]) % checkpoint == 0:
+                store.flush()
+    counts["seconds"] = time.perf_counter() - started
+    return counts
+
+def main():
+    global store
+    parser = argparse.ArgumentParser(description="Phase 1 CLI (JSON)")
+    parser.add_argument("--journal", action="store_true", help="append changes to a JSONL journal instead of rewriting the files")
+    parser.add_argument("--batch", metavar="FILE", help="apply JSONL commands from FILE (- for stdin) instead of the menu")
+    parser.add_argument("--checkpoint", type=int, default=CHECKPOINT_EVERY, help="batch commands between writes")
+    args = parser.parse_args()
+    store = JsonStore(journal=args.journal)
+    try:
+        if args.batch:
+            f = sys.stdin if args.batch == "-" else open(args.batch, "r", encoding="utf-8")
+            try:
+                counts = run_batch(f, sys.stdout, max(1, args.checkpoint))
+            finally:
+                if f is not sys.stdin:
+                    f.close()
+            total = counts["ok"] + counts["failed"]
+            rate = total / counts["seconds"] if counts["seconds"] else 0.0
+            print(f"{total} commands ({counts['ok']} ok, {counts['failed']} failed) in {counts['seconds']:.2f}s, "
+                  f"{rate:.0f} commands/sec", file=sys.stderr)
+        else:
+            menu()
+    finally:
+        store.close()
+
+def menu():
+    while True:
+        print("\n=== Phase 1 CLI (JSON) ===")
+        print("1. Add Donor")
+        print("2. View Donors")
+        print("3. Add Blood to Inventory")
+        print("4. View Inventory")
+        print("5. Issue Blood")
+        print("6. View Requests")
+        print("0. Exit")
+        ch = input("Choose: ").strip()
+        try:
+            if ch == "1":
+                add_donor()
+            elif ch == "2":
+                view_donors()
+            elif ch == "3":
+                add_inventory()
+            elif ch == "4":
+                view_inventory()
+            elif ch == "5":
+                issue_blood()
+            elif ch == "6":
+                view_requests()
+            elif ch == "0":
+                print("Bye.")
+                break
+            else:
+                print("Invalid choice.")
+        except Exception as e:
+            print("Error:", e)
+
+if __name__ == "__main__":
+    main()
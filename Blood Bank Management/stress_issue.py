@@ -0,0 +1,75 @@
+# Stress check — concurrent record_issue from several processes (uses database.py)
+# Seeds a scratch database with a known O- stock, lets every worker issue one unit
+# at a time until stock runs out, then checks that nothing was oversold.
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+import database
+
+MAX_CONSECUTIVE_ERRORS = 50
+
+def worker(db_file, recipient_id, results):
+    # A ValueError means stock ran out. Any other error is counted, and a worker that
+    # hits MAX_CONSECUTIVE_ERRORS in a row gives up instead of spinning forever.
+    database.DB_FILE = db_file
+    issued = errors = streak = 0
+    last_error = None
+    while streak < MAX_CONSECUTIVE_ERRORS:
+        try:
+            database.record_issue(recipient_id, "O-", 1)
+            issued += 1
+            streak = 0
+        except ValueError:
+            break
+        except Exception as e:
+            errors += 1
+            streak += 1
+            last_error = f"{type(e).__name__}: {e}"
+    results.put((issued, errors, last_error, streak >= MAX_CONSECUTIVE_ERRORS))
+
+def run(db_file, units, workers):
+    database.DB_FILE = db_file
+    database.init_db()
+    database.add_donor("Stress Donor", 30, "Other", None, None, "O-")
+    donor_id = database.list_donors()[0]["id"]
+    database.record_donation(donor_id, "O-", units)
+    for i in range(workers):
+        database.add_recipient(f"Stress Recipient {i}", 30, "O-", units, None)
+    recipient_ids = [r["id"] for r in database.list_recipients()]
+    database.close_conn()
+
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=worker, args=(db_file, rid, results)) for rid in recipient_ids]
+    start = time.perf_counter()
+    for p in procs: p.start()
+    counts = [results.get() for _ in procs]
+    for p in procs: p.join()
+    elapsed = time.perf_counter() - start
+
+    issued = sum(c[0] for c in counts)
+    conn = database.get_conn()
+    recorded = conn.execute("SELECT COALESCE(SUM(units),0) AS u FROM issues").fetchone()["u"]
+    allocated = conn.execute("SELECT COALESCE(SUM(units),0) AS u FROM issue_allocations").fetchone()["u"]
+    remaining = conn.execute("SELECT COALESCE(SUM(remaining_units),0) AS u FROM donations").fetchone()["u"]
+    drift = database.verify_inventory()
+    gave_up = [c for c in counts if c[3]]
+    print(f"{workers} workers issued {issued}/{units} units in {elapsed:.2f}s ({issued / elapsed:.0f} issues/sec), "
+          f"{sum(c[1] for c in counts)} unexpected errors")
+    for c in counts:
+        if c[2]:
+            print(f"  worker {'gave up' if c[3] else 'recovered'} after {c[1]} error(s), last: {c[2]}")
+    ok = issued == recorded == allocated == units and remaining == 0 and not drift and not gave_up
+    print("OK: no oversell" if ok else f"FAIL: issues={recorded} allocations={allocated} remaining={remaining} drift={drift} "
+                                         f"workers_gave_up={len(gave_up)}")
+    return ok
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent issuing stress check")
+    parser.add_argument("--units", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as d:
+        ok = run(os.path.join(d, "stress.db"), args.units, args.workers)
+    raise SystemExit(0 if ok else 1)
@@ -0,0 +1,38 @@
+# Tests — analytics.py (run with python -m pytest or python -m unittest)
+# Each test works on a scratch database in a temporary directory.
+import os
+import tempfile
+import threading
+import unittest
+import analytics
+import database
+
+@unittest.skipIf(analytics.np is None, "analytics needs NumPy")
+class CacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.saved_db = database.DB_FILE
+        database.DB_FILE = os.path.join(self.tmp.name, "test.db")
+        database.init_db()
+        analytics.invalidate()
+
+    def tearDown(self):
+        database.close_conn()
+        database.DB_FILE = self.saved_db
+        analytics.invalidate()
+        self.tmp.cleanup()
+
+    def test_new_connection_reloads_the_arrays(self):
+        database.add_donor("Test Donor", 30, "Other", "9000000000", "Test Street", "O-")
+        donor_id = database.list_donors()[0]["id"]
+        database.close_conn()
+        self.assertEqual(analytics.report_most_donated_group(), (None, 0))
+        writer = threading.Thread(target=lambda: (database.record_donation(donor_id, "O-", 5), database.close_conn()))
+        writer.start()
+        writer.join()
+        database.close_conn()
+        self.assertEqual(analytics.report_most_donated_group(), ("O-", 5))
+        self.assertEqual(analytics.report_most_donated_group(), database.report_most_donated_group())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,245 @@
+# Tests — database.py (run with python -m pytest or python -m unittest)
+# Each test works on a scratch database in a temporary directory.
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+import unittest
+import database
+
+WRITERS = 4
+WRITES_PER_WRITER = 150
+
+def _donation_writer(db_file, donor_id, count, results):
+    database.DB_FILE = db_file
+    failed = 0
+    for _ in range(count):
+        try:
+            database.record_donation(donor_id, "O+", 1)
+        except Exception:
+            failed += 1
+    database.close_conn()
+    results.put(failed)
+
+class DatabaseTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.saved_db = database.DB_FILE
+        database.DB_FILE = os.path.join(self.tmp.name, "test.db")
+        database.init_db()
+
+    def tearDown(self):
+        database.close_conn()
+        database.DB_FILE = self.saved_db
+        self.tmp.cleanup()
+
+    def add_donor(self, blood_group="O+"):
+        database.add_donor("Test Donor", 30, "Other", "9000000000", "Test Street", blood_group)
+        return database.list_donors()[-1]["id"]
+
+    def stock(self, blood_group):
+        return {r["blood_group"]: r["available_units"] for r in database.list_inventory()}[blood_group]
+
+class ConcurrentWriterTest(DatabaseTestCase):
+    def test_processes_record_donations_without_lock_errors(self):
+        donor_id = self.add_donor()
+        database.close_conn()
+        results = multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=_donation_writer,
+                                           args=(database.DB_FILE, donor_id, WRITES_PER_WRITER, results))
+                   for _ in range(WRITERS)]
+        for w in workers:
+            w.start()
+        failed = [results.get(timeout=120) for _ in workers]
+        for w in workers:
+            w.join()
+        self.assertEqual(failed, [0] * WRITERS)
+        self.assertEqual(self.stock("O+"), WRITERS * WRITES_PER_WRITER)
+        self.assertEqual(database.verify_inventory(), [])
+
+class DonationTest(DatabaseTestCase):
+    def test_future_donations_are_rejected(self):
+        donor_id = self.add_donor("A-")
+        tomorrow = (date.today() + timedelta(days=1)).isoformat()
+        with self.assertRaisesRegex(ValueError, "future"):
+            database.record_donation(donor_id, "A-", 2, tomorrow)
+        path = os.path.join(self.tmp.name, "donations.csv")
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write(f"donor_id,blood_group,units,donation_date\n{donor_id},A-,2,{tomorrow}\n{donor_id},A-,3,\n")
+        report = database.bulk_import_donations(path)
+        self.assertEqual(report["inserted"], 1)
+        self.assertEqual(self.stock("A-"), 3)
+        database.add_recipient("Test Patient", 40, "A-", 3, "Test Hospital")
+        database.record_issue(database.list_recipients()[0]["id"], "A-", 3)
+        self.assertEqual(self.stock("A-"), 0)
+
+class LedgerDriftTest(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.saved_expiry_days = database.DONATION_EXPIRY_DAYS
+
+    def tearDown(self):
+        database.DONATION_EXPIRY_DAYS = self.saved_expiry_days
+        super().tearDown()
+
+    def set_ledger(self, blood_group, units):
+        with database.transaction() as conn:
+            conn.execute("UPDATE inventory SET available_units = ? WHERE blood_group = ?",
+                         (units, database.BG_CODE[blood_group]))
+        database._invalidate_inventory()
+
+    def test_removing_more_than_the_ledger_holds_fails(self):
+        donor_id = self.add_donor("A+")
+        database.record_donation(donor_id, "A+", 3)
+        self.set_ledger("A+", 1)
+        with self.assertRaisesRegex(ValueError, "ledger out of step"):
+            database.delete_donor(donor_id)
+        self.assertEqual([d["id"] for d in database.list_donors()], [donor_id])
+        self.assertEqual(database.verify_inventory(), [("A+", 1, 3)])
+
+    def test_expiry_sweep_does_not_hide_drift(self):
+        donor_id = self.add_donor("B+")
+        database.DONATION_EXPIRY_DAYS = 0
+        database.record_donation(donor_id, "B+", 3)
+        self.set_ledger("B+", 1)
+        time.sleep(1.1)
+        self.assertEqual(database.verify_inventory(), [("B+", 1, 0)])
+        self.assertEqual(database.verify_inventory(repair=True), [("B+", 1, 0)])
+        self.assertEqual(database.verify_inventory(), [])
+        self.assertEqual(self.stock("B+"), 0)
+        self.assertEqual([(r["blood_group"], r["units"]) for r in database.wastage_report()], [("B+", 3)])
+
+class InventoryCacheTest(DatabaseTestCase):
+    def test_new_connection_does_not_reuse_the_snapshot(self):
+        donor_id = self.add_donor("O-")
+        database.close_conn()
+        self.assertEqual(self.stock("O-"), 0)
+        database.close_conn()
+        writer = threading.Thread(target=lambda: (database.record_donation(donor_id, "O-", 5), database.close_conn()))
+        writer.start()
+        writer.join()
+        self.assertEqual(self.stock("O-"), 5)
+        self.assertEqual(database.report_totals()[1], 5)
+
+    def test_switching_database_does_not_reuse_the_snapshot(self):
+        first, other = database.DB_FILE, os.path.join(self.tmp.name, "other.db")
+        database.record_donation(self.add_donor("O-"), "O-", 5)
+        database.DB_FILE = other
+        database.init_db()
+        database.close_conn()
+        database.DB_FILE = first
+        self.assertEqual(self.stock("O-"), 5)
+        database.DB_FILE = other
+        self.assertEqual(self.stock("O-"), 0)
+
+class BulkImportTest(DatabaseTestCase):
+    def test_repeated_donor_keeps_latest_date_whatever_the_chunk_size(self):
+        path = os.path.join(self.tmp.name, "donors.csv")
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write("name,age,gender,phone,address,blood_group,last_donation_date\n"
+                    "Repeat Donor,30,Male,1,First,O+,2025-01-01\n"
+                    "Repeat Donor,31,Male,1,Second,O+,\n"
+                    "Repeat Donor,32,Male,1,Third,O+,2024-01-01\n")
+        for chunk_size in (1, 2, 10):
+            with self.subTest(chunk_size=chunk_size):
+                with database.transaction() as conn:
+                    conn.execute("DELETE FROM donors")
+                database.bulk_import_donors(path, chunk_size=chunk_size)
+                donors = database.list_donors()
+                self.assertEqual([(d["age"], d["address"], d["last_donation_date"]) for d in donors],
+                                 [(32, "Third", "2025-01-01")])
+
+class Phase1MigrationTest(DatabaseTestCase):
+    def write_phase1(self, **files):
+        directory = os.path.join(self.tmp.name, "phase1")
+        os.makedirs(directory, exist_ok=True)
+        for kind, text in files.items():
+            with open(os.path.join(directory, f"{kind}.json"), "w", encoding="utf-8") as f:
+                f.write(text if isinstance(text, str) else json.dumps(text))
+        return directory
+
+    def test_migrated_stock_is_not_a_donor_or_a_donation(self):
+        directory = self.write_phase1(
+            donors=[{"id": 1, "name": "Real Donor", "age": 30, "gender": "Male", "phone": "1",
+                     "address": "Road", "blood_group": "O-", "last_donation_date": None}],
+            inventory=[{"blood_group": "O-", "quantity": 7, "last_updated": "2025-01-01 00:00:00"}],
+            requests=[{"blood_group": "O-", "quantity": 2, "issue_date": "2025-01-01 00:00:00"}])
+        database.migrate_phase1(directory)
+        self.assertEqual(self.stock("O-"), 7)
+        self.assertEqual(database.list_recipients(), [])
+        self.assertEqual(database.pending_recipients(), [])
+        self.assertEqual([r["name"] for r in database.iter_donors()], ["Real Donor"])
+        self.assertEqual(list(database.iter_donations()), [])
+        self.assertEqual([r["units"] for r in database.iter_issues()], [2])
+        for rows in (database.list_donors(), database.eligible_donors(), database.search_donors("Phase"),
+                     database.search_donors(blood_group="O-"), database.match_compatible_donors("AB+"),
+                     database.match_eligible_donors("O-")[0]):
+            self.assertEqual([r["name"] for r in rows if r["name"] != "Real Donor"], [])
+        self.assertEqual(database.report_totals(), (1, 7))
+        self.assertEqual(database.report_daily_donations(), [])
+        self.assertEqual(database.report_most_donated_group(), (None, 0))
+
+    def test_malformed_element_reports_its_offset(self):
+        text = json.dumps([{"name": f"Donor {i}", "age": 30, "blood_group": "A+"} for i in range(50)])
+        offset = text.index('"Donor 25"') - 1
+        directory = self.write_phase1(donors=text[:offset] + "{oops" + text[offset + 1:])
+        with self.assertRaisesRegex(ValueError, f"character {offset + 1}"):
+            list(database._iter_json_array(os.path.join(directory, "donors.json"), read_size=64))
+
+class ExpirySchedulerTest(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.saved_settings = database.EXPIRY_HEAP_SIZE, database.DONATION_EXPIRY_DAYS
+        self.alerts = []
+        database.add_low_stock_listener(self.on_low_stock)
+
+    def tearDown(self):
+        database.remove_low_stock_listener(self.on_low_stock)
+        database.EXPIRY_HEAP_SIZE, database.DONATION_EXPIRY_DAYS = self.saved_settings
+        super().tearDown()
+
+    def on_low_stock(self, blood_group, units):
+        self.alerts.append(blood_group)
+
+    def ledger(self, blood_group):
+        # Straight from the inventory table, so no read-path sweep is involved.
+        return database.get_conn().execute("SELECT available_units FROM inventory WHERE blood_group = ?",
+                                           (database.BG_CODE[blood_group],)).fetchone()[0]
+
+    def wait_for(self, condition, timeout=8):
+        deadline = time.monotonic() + timeout
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.1)
+        return condition()
+
+    def test_lots_beyond_heap_and_added_after_start_are_retired(self):
+        database.EXPIRY_HEAP_SIZE = 2
+        o_pos, o_neg, a_pos = self.add_donor("O+"), self.add_donor("O-"), self.add_donor("A+")
+        database.record_donation(a_pos, "A+", 10)
+        scheduler = database.ExpiryScheduler().start()
+        try:
+            self.assertTrue(self.wait_for(lambda: scheduler.heap))
+            # Lots recorded now with no shelf life expire within the next second.
+            database.DONATION_EXPIRY_DAYS = 0
+            for _ in range(3):
+                database.record_donation(o_pos, "O+", 1)
+            database.record_donation(o_neg, "O-", 2)
+            self.assertTrue(self.wait_for(lambda: self.ledger("O+") == 0 and self.ledger("O-") == 0))
+        finally:
+            scheduler.stop()
+        self.assertEqual(self.ledger("A+"), 10)
+        self.assertEqual(sorted(r["blood_group"] for r in database.wastage_report()), ["O+", "O-"])
+        self.assertEqual(sorted(set(self.alerts)), ["O+", "O-"])
+
+    def test_inventory_reads_retire_expired_lots(self):
+        donor_id = self.add_donor("B+")
+        database.DONATION_EXPIRY_DAYS = 0
+        database.record_donation(donor_id, "B+", 3)
+        self.assertTrue(self.wait_for(lambda: self.stock("B+") == 0, timeout=4))
+        self.assertEqual(database.verify_inventory(), [])
+
+if __name__ == "__main__":
+    unittest.main()
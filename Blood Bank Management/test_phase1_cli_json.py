@@ -0,0 +1,105 @@
+# Tests — phase1_cli_json.py JsonStore (run with python -m pytest or python -m unittest)
+# The store works on the current directory, so each test runs in a temporary one.
+import multiprocessing
+import os
+import tempfile
+import unittest
+import phase1_cli_json as p1
+
+OPS_PER_WRITER = 60
+
+def _writer(directory, journal, tag, results):
+    os.chdir(directory)
+    store = p1.JsonStore(journal=journal)
+    try:
+        for i in range(OPS_PER_WRITER):
+            store.add_donor(f"{tag} {i}", 30, "Other", None, None, "O+")
+            store.add_stock("O+", 1)
+    finally:
+        store.close()
+    results.put(tag)
+
+class JsonStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.saved_cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+
+    def tearDown(self):
+        os.chdir(self.saved_cwd)
+        self.tmp.cleanup()
+
+    def run_store(self, journal, *ops):
+        store = p1.JsonStore(journal=journal)
+        try:
+            for op, *args in ops:
+                getattr(store, op)(*args)
+        finally:
+            store.close()
+
+    def saved(self):
+        donors = p1.load(p1.DONORS_FILE)
+        stock = {i["blood_group"]: i["quantity"] for i in p1.load(p1.INVENTORY_FILE)}
+        return donors, stock
+
+class MixedModeTest(JsonStoreTestCase):
+    def test_modes_in_turn_keep_each_others_writes(self):
+        self.run_store(True, ("add_donor", "A", 30, "Other", None, None, "O+"))
+        self.run_store(False, ("add_donor", "B", 30, "Other", None, None, "O+"), ("add_stock", "O+", 5))
+        self.run_store(True, ("add_donor", "C", 30, "Other", None, None, "O+"), ("issue", "O+", 2))
+        self.run_store(False, ("add_donor", "D", 30, "Other", None, None, "O+"))
+        donors, stock = self.saved()
+        self.assertEqual([(d["id"], d["name"]) for d in donors], [(1, "A"), (2, "B"), (3, "C"), (4, "D")])
+        self.assertEqual(stock, {"O+": 3})
+        self.assertEqual(len(p1.load(p1.REQUESTS_FILE)), 1)
+
+    def test_open_stores_see_each_others_writes(self):
+        journal, plain = p1.JsonStore(journal=True), p1.JsonStore()
+        try:
+            journal.add_stock("O+", 4)
+            plain.add_donor("B", 30, "Other", None, None, "O+")
+            journal.add_donor("C", 30, "Other", None, None, "O+")
+            plain.add_stock("O+", 1)
+            journal.issue("O+", 2)
+            plain.add_donor("D", 30, "Other", None, None, "O+")
+        finally:
+            plain.close()
+            journal.close()
+        donors, stock = self.saved()
+        self.assertEqual([(d["id"], d["name"]) for d in donors], [(1, "B"), (2, "C"), (3, "D")])
+        self.assertEqual(stock, {"O+": 3})
+
+    def test_plain_write_sees_pending_journal_records(self):
+        journal = p1.JsonStore(journal=True)
+        try:
+            journal.add_stock("O+", 4)
+            self.run_store(False, ("add_donor", "B", 30, "Other", None, None, "O+"), ("add_stock", "O+", 1))
+            journal.add_donor("C", 30, "Other", None, None, "O+")
+        finally:
+            journal.close()
+        donors, stock = self.saved()
+        self.assertEqual([(d["id"], d["name"]) for d in donors], [(1, "B"), (2, "C")])
+        self.assertEqual(stock, {"O+": 5})
+
+    def test_concurrent_processes_in_both_modes(self):
+        results = multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=_writer, args=(self.tmp.name, journal, f"{mode} {n}", results))
+                   for n in range(2) for journal, mode in ((True, "journal"), (False, "plain"))]
+        for w in workers:
+            w.start()
+        done = [results.get(timeout=120) for _ in workers]
+        for w in workers:
+            w.join()
+        self.assertEqual(len(done), len(workers))
+        donors, stock = self.saved()
+        self.assertEqual(len(donors), len(workers) * OPS_PER_WRITER)
+        self.assertEqual(sorted(d["id"] for d in donors), list(range(1, len(donors) + 1)))
+        self.assertEqual(stock, {"O+": len(workers) * OPS_PER_WRITER})
+        store = p1.JsonStore(journal=True)
+        try:
+            self.assertEqual(store.donors, donors)
+        finally:
+            store.close()
+
+if __name__ == "__main__":
+    unittest.main()
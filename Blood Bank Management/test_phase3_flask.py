@@ -0,0 +1,84 @@
+# Tests — phase3_flask.py API (run with python -m pytest or python -m unittest)
+# The app is pointed at a scratch SQLite database through DATABASE_URL before import.
+import json
+import os
+import tempfile
+import unittest
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_tmp.name, "api.db")
+import phase3_flask as api
+
+class ApiTestCase(unittest.TestCase):
+    def setUp(self):
+        with api.app.app_context():
+            api.db.drop_all()
+        self.client = api.app.test_client()
+        self.assertEqual(self.client.post("/init").status_code, 200)
+
+    def add_recipient(self, blood_group="A+"):
+        return self.client.post("/recipients", json={"name": "Test Patient", "age": 40, "required_blood_group": blood_group,
+                                                     "quantity_needed": 2}).json["id"]
+
+class StockTest(ApiTestCase):
+    def test_supply_reads_the_stock_table(self):
+        donor = self.client.post("/donors", json={"name": "Test Donor", "age": 30, "blood_group": "A+"}).json["id"]
+        for units in (3, 4):
+            self.assertEqual(self.client.post("/donations", json={"donor_id": donor, "blood_group": "A+", "units": units}).status_code, 200)
+        recipient = self.add_recipient()
+        self.assertEqual(self.client.post("/issues", json={"recipient_id": recipient, "requested_blood_group": "A+",
+                                                           "units": 2}).json, {"issued_group": "A+"})
+        supply = {g["blood_group"]: g for g in self.client.get("/supply").json["groups"]}
+        self.assertEqual(supply["A+"]["available_units"], 5)
+        self.assertEqual(supply["O-"]["available_units"], 0)
+        with api.app.app_context():
+            api.Stock.query.filter_by(blood_group="A+").update({"units": 1})
+            api.db.session.commit()
+        supply = {g["blood_group"]: g for g in self.client.get("/supply").json["groups"]}
+        self.assertEqual(supply["A+"]["available_units"], 1)
+
+    def test_uninitialised_stock_is_503_everywhere(self):
+        donor = self.client.post("/donors", json={"name": "Test Donor", "age": 30, "blood_group": "A+"}).json["id"]
+        recipient = self.add_recipient()
+        with api.app.app_context():
+            api.Stock.query.delete()
+            api.db.session.commit()
+        for response in (self.client.post("/donations", json={"donor_id": donor, "blood_group": "A+", "units": 1}),
+                         self.client.post("/issues", json={"recipient_id": recipient, "requested_blood_group": "A+", "units": 1}),
+                         self.client.get("/supply")):
+            self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.client.post("/init").status_code, 200)
+        self.assertEqual(self.client.post("/issues", json={"recipient_id": recipient, "requested_blood_group": "A+",
+                                                           "units": 1}).status_code, 400)
+
+class CursorTest(ApiTestCase):
+    def test_tampered_cursors_are_bad_requests(self):
+        for _ in range(3):
+            self.add_recipient()
+        page = self.client.get("/recipients?limit=2").json
+        self.assertEqual(self.client.get(f"/recipients?limit=2&after={page['next']}").status_code, 200)
+        for token in (api._encode_cursor(5, 1), api._encode_cursor(None, 1), api._encode_cursor("2025-01-01", "x"),
+                      api._encode_cursor("not a date", 1), "bm90IGpzb24", "%%%"):
+            with self.subTest(token=token):
+                response = self.client.get(f"/recipients?after={token}")
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json, {"error": "Invalid cursor"})
+        self.assertEqual(self.client.get(f"/donors?after={api._encode_cursor([1], 1)}").status_code, 400)
+
+class StreamTest(ApiTestCase):
+    def test_ndjson_honours_limit_and_after(self):
+        ids = [self.add_recipient() for _ in range(5)]
+        def streamed(query):
+            response = self.client.get(f"/recipients?format=ndjson{query}")
+            self.assertEqual(response.status_code, 200)
+            return [json.loads(line)["id"] for line in response.data.decode().splitlines()]
+        everything = streamed("")
+        self.assertEqual(sorted(everything), ids)
+        self.assertEqual(streamed("&limit=2"), everything[:2])
+        page = self.client.get("/recipients?limit=2").json
+        self.assertEqual(streamed(f"&after={page['next']}"), everything[2:])
+        self.assertEqual(streamed(f"&limit=1&after={page['next']}"), everything[2:3])
+        self.assertEqual(self.client.get("/recipients?format=ndjson&limit=x").status_code, 400)
+
+if __name__ == "__main__":
+    unittest.main()